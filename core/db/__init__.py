@@ -1,13 +1,13 @@
-"""
-Database package для Liquid Planet Bot
-"""
-
-from .models import Base, User, Model, Product, Cart, Order, OrderItem, BotSettings
-from .database import init_db, get_session, close_db, async_session_maker, engine
-from . import crud
-
-__all__ = [
-    'Base', 'User', 'Model', 'Product', 'Cart', 'Order', 'OrderItem', 'BotSettings',
-    'init_db', 'get_session', 'close_db', 'async_session_maker', 'engine',
-    'crud'
-]
+"""
+Database package для Liquid Planet Bot
+"""
+
+from .models import Base, User, Model, Product, Cart, CartSummary, Order, OrderItem, BotSettings, OrderStatus, DeliveryMethod, euros, to_cents
+from .database import DB_PATH, init_db, warm_up_pool, get_sqlite_pragmas, checkpoint_db, snapshot_db, backup_db, get_session, close_db, async_session_maker, engine
+from . import crud
+
+__all__ = [
+    'Base', 'User', 'Model', 'Product', 'Cart', 'CartSummary', 'Order', 'OrderItem', 'BotSettings', 'OrderStatus', 'DeliveryMethod', 'euros', 'to_cents',
+    'DB_PATH', 'init_db', 'warm_up_pool', 'get_sqlite_pragmas', 'checkpoint_db', 'snapshot_db', 'backup_db', 'get_session', 'close_db', 'async_session_maker', 'engine',
+    'crud'
+]
@@ -1,663 +1,841 @@
-"""
-CRUD операции для работы с базой данных
-"""
-
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, and_, func
-from .models import User, Model, Product, Cart, Order, OrderItem, BotSettings
-from typing import Optional, List
-from datetime import datetime
-import logging
-
-logger = logging.getLogger(__name__)
-
-
-# ==================== USERS ====================
-
-async def get_or_create_user(session: AsyncSession, telegram_id: int, username: Optional[str] = None, 
-                             first_name: Optional[str] = None, last_name: Optional[str] = None) -> User:
-    """Получить пользователя или создать нового, обновляет данные при каждом заходе"""
-    result = await session.execute(select(User).where(User.telegram_id == telegram_id))
-    user = result.scalar_one_or_none()
-    
-    if not user:
-        user = User(
-            telegram_id=telegram_id,
-            username=username,
-            first_name=first_name,
-            last_name=last_name
-        )
-        session.add(user)
-    else:
-        # Обновляем данные пользователя при каждом заходе (для отслеживания смены ника/имени)
-        user.username = username
-        user.first_name = first_name
-        user.last_name = last_name
-    
-    await session.commit()
-    await session.refresh(user)
-    
-    return user
-
-
-async def get_user_by_telegram_id(session: AsyncSession, telegram_id: int) -> Optional[User]:
-    """Получить пользователя по telegram_id"""
-    result = await session.execute(select(User).where(User.telegram_id == telegram_id))
-    return result.scalar_one_or_none()
-
-
-async def ban_user(session: AsyncSession, user_id: int, ban: bool = True):
-    """Забанить/разбанить пользователя"""
-    await session.execute(
-        update(User).where(User.id == user_id).values(is_banned=ban)
-    )
-    await session.commit()
-
-
-async def get_all_users(session: AsyncSession) -> List[User]:
-    """Получить всех пользователей"""
-    result = await session.execute(select(User))
-    return result.scalars().all()
-
-
-# ==================== MODELS ====================
-
-async def create_model(session: AsyncSession, name: str, description: Optional[str] = None, 
-                      image_path: Optional[str] = None, cost_price: float = 0.0) -> Model:
-    """Создать новую модель"""
-    model = Model(
-        name=name,
-        description=description,
-        image_path=image_path,
-        cost_price=cost_price
-    )
-    session.add(model)
-    await session.commit()
-    await session.refresh(model)
-    return model
-
-
-async def get_all_models(session: AsyncSession, available_only: bool = True) -> List[Model]:
-    """Получить все модели"""
-    query = select(Model)
-    if available_only:
-        query = query.where(Model.is_available == True)
-    
-    result = await session.execute(query)
-    return result.scalars().all()
-
-
-async def get_model_by_id(session: AsyncSession, model_id: int) -> Optional[Model]:
-    """Получить модель по ID"""
-    result = await session.execute(select(Model).where(Model.id == model_id))
-    return result.scalar_one_or_none()
-
-
-async def update_model(session: AsyncSession, model_id: int, **kwargs):
-    """Обновить модель"""
-    await session.execute(
-        update(Model).where(Model.id == model_id).values(**kwargs)
-    )
-    await session.commit()
-
-
-async def delete_model(session: AsyncSession, model_id: int):
-    """Удалить модель"""
-    await session.execute(delete(Model).where(Model.id == model_id))
-    await session.commit()
-
-
-# ==================== PRODUCTS ====================
-
-async def create_product(session: AsyncSession, model_id: int, flavor_name: str, 
-                        price: float, stock_quantity: int = 0) -> Product:
-    """Создать новый продукт (вкус)"""
-    product = Product(
-        model_id=model_id,
-        flavor_name=flavor_name,
-        price=price,
-        stock_quantity=stock_quantity
-    )
-    session.add(product)
-    await session.commit()
-    await session.refresh(product)
-    return product
-
-
-async def get_products_by_model(session: AsyncSession, model_id: int, available_only: bool = True) -> List[Product]:
-    """Получить все вкусы для модели"""
-    query = select(Product).where(Product.model_id == model_id)
-    if available_only:
-        query = query.where(and_(Product.is_available == True, Product.stock_quantity > 0))
-    
-    result = await session.execute(query)
-    return result.scalars().all()
-
-
-async def get_product_by_id(session: AsyncSession, product_id: int) -> Optional[Product]:
-    """Получить продукт по ID"""
-    result = await session.execute(select(Product).where(Product.id == product_id))
-    return result.scalar_one_or_none()
-
-
-async def update_product(session: AsyncSession, product_id: int, **kwargs):
-    """Обновить продукт"""
-    await session.execute(
-        update(Product).where(Product.id == product_id).values(**kwargs)
-    )
-    await session.commit()
-
-
-async def update_stock(session: AsyncSession, product_id: int, quantity_change: int):
-    """Обновить количество на складе (+ или -)"""
-    product = await get_product_by_id(session, product_id)
-    if product:
-        new_quantity = product.stock_quantity + quantity_change
-        await update_product(session, product_id, stock_quantity=max(0, new_quantity))
-
-
-async def delete_product(session: AsyncSession, product_id: int):
-    """Удалить продукт"""
-    await session.execute(delete(Product).where(Product.id == product_id))
-    await session.commit()
-
-
-# ==================== CART ====================
-
-async def add_to_cart(session: AsyncSession, user_id: int, product_id: int, quantity: int = 1) -> Cart:
-    """Добавить товар в корзину. Если товар уже есть - увеличивает количество."""
-    logger.info(f"add_to_cart вызвана: user_id={user_id}, product_id={product_id}, quantity={quantity}")
-    
-    # Сначала объединяем возможные дубликаты этого товара
-    await merge_duplicate_cart_items(session, user_id)
-    
-    # Проверяем есть ли уже такой товар в корзине с блокировкой для предотвращения race condition
-    result = await session.execute(
-        select(Cart).where(and_(Cart.user_id == user_id, Cart.product_id == product_id)).with_for_update()
-    )
-    cart_item = result.scalar_one_or_none()
-    
-    logger.info(f"Найдено в корзине: {cart_item.quantity if cart_item else 'ничего'}")
-    
-    if cart_item:
-        # Увеличиваем количество
-        old_qty = cart_item.quantity
-        cart_item.quantity += quantity
-        logger.info(f"Увеличено: {old_qty} + {quantity} = {cart_item.quantity}")
-    else:
-        # Создаем новый элемент корзины
-        cart_item = Cart(user_id=user_id, product_id=product_id, quantity=quantity)
-        session.add(cart_item)
-        logger.info(f"Создан новый элемент корзины: quantity={quantity}")
-    
-    await session.commit()
-    await session.refresh(cart_item)
-    logger.info(f"После commit: cart_item.id={cart_item.id}, quantity={cart_item.quantity}")
-    return cart_item
-
-
-async def get_user_cart(session: AsyncSession, user_id: int) -> List[Cart]:
-    """Получить корзину пользователя"""
-    # Сначала объединяем дубликаты товаров в корзине
-    await merge_duplicate_cart_items(session, user_id)
-    
-    # Получаем корзину одним запросом
-    result = await session.execute(
-        select(Cart).where(Cart.user_id == user_id).order_by(Cart.id)
-    )
-    return result.scalars().all()
-
-
-async def merge_duplicate_cart_items(session: AsyncSession, user_id: int):
-    """Объединить дубликаты товаров в корзине"""
-    # Получаем все элементы корзины отсортированные по ID (старые первыми)
-    result = await session.execute(
-        select(Cart).where(Cart.user_id == user_id).order_by(Cart.id)
-    )
-    cart_items = result.scalars().all()
-    
-    if len(cart_items) <= 1:
-        return  # Нечего объединять
-    
-    # Группируем по product_id
-    product_groups = {}
-    for item in cart_items:
-        if item.product_id in product_groups:
-            product_groups[item.product_id].append(item)
-        else:
-            product_groups[item.product_id] = [item]
-    
-    # Объединяем дубликаты
-    has_changes = False
-    for product_id, items in product_groups.items():
-        if len(items) > 1:
-            has_changes = True
-            # Оставляем первый элемент (самый старый), увеличиваем его количество
-            total_quantity = sum(item.quantity for item in items)
-            first_item = items[0]
-            first_item.quantity = total_quantity
-            
-            # Удаляем остальные дубликаты
-            for item in items[1:]:
-                await session.delete(item)
-    
-    if has_changes:
-        await session.commit()
-
-
-async def update_cart_item_quantity(session: AsyncSession, cart_id: int, quantity: int):
-    """Обновить количество товара в корзине"""
-    if quantity <= 0:
-        await session.execute(delete(Cart).where(Cart.id == cart_id))
-    else:
-        await session.execute(
-            update(Cart).where(Cart.id == cart_id).values(quantity=quantity)
-        )
-    await session.commit()
-
-
-async def remove_from_cart(session: AsyncSession, cart_id: int):
-    """Удалить товар из корзины"""
-    await session.execute(delete(Cart).where(Cart.id == cart_id))
-    await session.commit()
-
-
-async def clear_user_cart(session: AsyncSession, user_id: int):
-    """Очистить всю корзину пользователя"""
-    await session.execute(delete(Cart).where(Cart.user_id == user_id))
-    await session.commit()
-
-
-# ==================== ORDERS ====================
-
-async def create_order(session: AsyncSession, user_id: int, cart_items: List[Cart], 
-                      contact_info: Optional[str] = None, delivery_method: str = 'pickup', 
-                      delivery_fee: float = 0.0, merge_with_existing: bool = False) -> Order:
-    """Создать заказ из корзины. 
-    
-    Args:
-        merge_with_existing: Если True, добавляет товары к существующему заказу со статусом 'processing'.
-                            Если False (по умолчанию), всегда создает новый заказ.
-    """
-    # Дополнительная защита - объединяем дубликаты в корзине перед созданием заказа
-    await merge_duplicate_cart_items(session, user_id)
-    
-    # Перезапрашиваем корзину после объединения дубликатов (ВАЖНО: перезаписываем параметр)
-    cart_query_result = await session.execute(
-        select(Cart).where(Cart.user_id == user_id).order_by(Cart.id)
-    )
-    cart_items = cart_query_result.scalars().all()
-    
-    # Проверяем есть ли активный заказ "В процессе" у пользователя
-    result = await session.execute(
-        select(Order).where(
-            and_(Order.user_id == user_id, Order.status == 'processing')
-        ).order_by(Order.created_at.desc())
-    )
-    existing_order = result.scalars().first()
-    
-    if existing_order and merge_with_existing:
-        # Добавляем товары к существующему заказу
-        total_price_add = 0.0
-        
-        for cart_item in cart_items:
-            product = await get_product_by_id(session, cart_item.product_id)
-            if product and product.is_available and product.stock_quantity >= cart_item.quantity:
-                item_price = product.price * cart_item.quantity
-                total_price_add += item_price
-                
-                # Проверяем есть ли уже такой товар в заказе
-                existing_item_result = await session.execute(
-                    select(OrderItem).where(
-                        and_(
-                            OrderItem.order_id == existing_order.id,
-                            OrderItem.product_id == product.id,
-                            OrderItem.price_at_order == product.price
-                        )
-                    )
-                )
-                existing_items = existing_item_result.scalars().all()
-                
-                if existing_items:
-                    # Увеличиваем количество в первой записи
-                    existing_items[0].quantity += cart_item.quantity
-                    
-                    # Удаляем остальные дубликаты если есть
-                    for duplicate in existing_items[1:]:
-                        await session.delete(duplicate)
-                else:
-                    # Создаем новую запись
-                    order_item = OrderItem(
-                        order_id=existing_order.id,
-                        product_id=product.id,
-                        quantity=cart_item.quantity,
-                        price_at_order=product.price
-                    )
-                    session.add(order_item)
-                
-                # Уменьшаем количество на складе
-                await update_stock(session, product.id, -cart_item.quantity)
-        
-        # Обновляем общую сумму заказа
-        existing_order.total_price += total_price_add
-        await session.commit()
-        
-        # Очищаем корзину
-        await clear_user_cart(session, user_id)
-        
-        return existing_order
-    
-    else:
-        # Создаем новый заказ
-        logger.info(f"Создание нового заказа для user_id={user_id}, cart_items count={len(cart_items)}")
-        for i, ci in enumerate(cart_items):
-            logger.info(f"  Cart Item #{i}: id={ci.id}, product_id={ci.product_id}, quantity={ci.quantity}")
-        total_price = 0.0
-        order_items_dict = {}  # Используем словарь для группировки по product_id
-        
-        for i, cart_item in enumerate(cart_items):
-            logger.info(f"Обработка cart_item #{i}: product_id={cart_item.product_id}, quantity={cart_item.quantity}")
-            product = await get_product_by_id(session, cart_item.product_id)
-            if product and product.is_available and product.stock_quantity >= cart_item.quantity:
-                item_price = product.price * cart_item.quantity
-                total_price += item_price
-                
-                # Группируем по product_id + price (на случай если цена изменилась)
-                key = (product.id, product.price)
-                logger.info(f"Ключ для группировки: {key}, уже есть в dict: {key in order_items_dict}")
-                
-                if key in order_items_dict:
-                    # Увеличиваем количество существующего товара
-                    old_qty = order_items_dict[key]['quantity']
-                    order_items_dict[key]['quantity'] += cart_item.quantity
-                    logger.info(f"Увеличено количество: {old_qty} + {cart_item.quantity} = {order_items_dict[key]['quantity']}")
-                else:
-                    # Добавляем новый товар
-                    order_items_dict[key] = {
-                        'product_id': product.id,
-                        'quantity': cart_item.quantity,
-                        'price_at_order': product.price
-                    }
-                    logger.info(f"Создана новая запись в dict: quantity={cart_item.quantity}")
-                
-                # Уменьшаем количество на складе
-                await update_stock(session, product.id, -cart_item.quantity)
-        
-        # Добавляем стоимость доставки
-        total_price += delivery_fee
-        
-        # Создаем заказ
-        order = Order(
-            user_id=user_id,
-            total_price=total_price,
-            contact_info=contact_info,
-            delivery_method=delivery_method,
-            delivery_fee=delivery_fee
-        )
-        session.add(order)
-        await session.commit()
-        await session.refresh(order)
-        
-        # ПРОВЕРКА: есть ли уже OrderItem для этого заказа?
-        check_result = await session.execute(select(OrderItem).where(OrderItem.order_id == order.id))
-        existing_order_items = check_result.scalars().all()
-        logger.info(f"ПОСЛЕ СОЗДАНИЯ ЗАКАЗА: найдено {len(existing_order_items)} существующих OrderItem для order_id={order.id}")
-        
-        # ЗАЩИТА: удаляем все старые OrderItem (не должно быть, но на случай багов)
-        if existing_order_items:
-            logger.warning(f"ВНИМАНИЕ! Найдены старые OrderItem для нового заказа - удаляем их!")
-            for old_item in existing_order_items:
-                await session.delete(old_item)
-            await session.commit()
-        
-        # Добавляем товары в заказ (из словаря, уже объединенные)
-        logger.info(f"Создание OrderItem: всего позиций в dict={len(order_items_dict)}")
-        for j, item_data in enumerate(order_items_dict.values()):
-            logger.info(f"Создание OrderItem #{j}: product_id={item_data['product_id']}, quantity={item_data['quantity']}")
-            order_item = OrderItem(
-                order_id=order.id,
-                **item_data
-            )
-            session.add(order_item)
-        
-        await session.commit()
-        
-        # Очищаем корзину
-        await clear_user_cart(session, user_id)
-        
-        return order
-
-
-async def get_order_by_id(session: AsyncSession, order_id: int) -> Optional[Order]:
-    """Получить заказ по ID"""
-    result = await session.execute(select(Order).where(Order.id == order_id))
-    order = result.scalar_one_or_none()
-    return order
-
-
-async def merge_duplicate_order_items(session: AsyncSession, order_id: int):
-    """Объединить дубликаты товаров в заказе"""
-    result = await session.execute(
-        select(OrderItem).where(OrderItem.order_id == order_id)
-    )
-    order_items = result.scalars().all()
-    
-    # Группируем по product_id и price_at_order
-    product_groups = {}
-    for item in order_items:
-        key = (item.product_id, item.price_at_order)
-        if key in product_groups:
-            product_groups[key].append(item)
-        else:
-            product_groups[key] = [item]
-    
-    # Объединяем дубликаты
-    for key, items in product_groups.items():
-        if len(items) > 1:
-            # Оставляем первый элемент, увеличиваем его количество
-            total_quantity = sum(item.quantity for item in items)
-            first_item = items[0]
-            first_item.quantity = total_quantity
-            
-            # Удаляем остальные
-            for item in items[1:]:
-                await session.delete(item)
-    
-    await session.commit()
-
-
-async def get_user_orders(session: AsyncSession, user_id: int) -> List[Order]:
-    """Получить все заказы пользователя"""
-    result = await session.execute(
-        select(Order).where(Order.user_id == user_id).order_by(Order.created_at.desc())
-    )
-    return result.scalars().all()
-
-
-async def get_all_orders(session: AsyncSession) -> List[Order]:
-    """Получить все заказы"""
-    result = await session.execute(select(Order).order_by(Order.created_at.desc()))
-    return result.scalars().all()
-
-
-async def update_order_status(session: AsyncSession, order_id: int, status: str):
-    """Обновить статус заказа"""
-    await session.execute(
-        update(Order).where(Order.id == order_id).values(status=status, updated_at=datetime.utcnow())
-    )
-    await session.commit()
-
-
-async def delete_order(session: AsyncSession, order_id: int):
-    """Удалить заказ и вернуть товары на склад"""
-    # Получаем заказ и его товары
-    order = await get_order_by_id(session, order_id)
-    if not order:
-        return False
-    
-    # Получаем товары в заказе
-    items_result = await session.execute(
-        select(OrderItem).where(OrderItem.order_id == order_id)
-    )
-    items = items_result.scalars().all()
-    
-    # Возвращаем товары на склад
-    for item in items:
-        await update_stock(session, item.product_id, item.quantity)
-    
-    # Удаляем заказ (OrderItems удалятся автоматически через cascade)
-    await session.execute(delete(Order).where(Order.id == order_id))
-    await session.commit()
-    return True
-
-
-# ==================== BOT SETTINGS ====================
-
-async def get_setting(session: AsyncSession, key: str) -> Optional[str]:
-    """Получить настройку бота"""
-    result = await session.execute(select(BotSettings).where(BotSettings.setting_key == key))
-    setting = result.scalar_one_or_none()
-    return setting.setting_value if setting else None
-
-
-async def update_setting(session: AsyncSession, key: str, value: str):
-    """Обновить настройку бота"""
-    result = await session.execute(select(BotSettings).where(BotSettings.setting_key == key))
-    setting = result.scalar_one_or_none()
-    
-    if setting:
-        await session.execute(
-            update(BotSettings).where(BotSettings.setting_key == key).values(
-                setting_value=value,
-                updated_at=datetime.utcnow()
-            )
-        )
-    else:
-        new_setting = BotSettings(setting_key=key, setting_value=value)
-        session.add(new_setting)
-    
-    await session.commit()
-
-
-# ==================== STATISTICS ====================
-
-async def get_total_revenue(session: AsyncSession) -> float:
-    """Получить общую выручку"""
-    result = await session.execute(
-        select(func.sum(Order.total_price)).where(Order.status.in_(['completed', 'processing']))
-    )
-    total = result.scalar_one_or_none()
-    return total or 0.0
-
-
-async def get_total_orders_count(session: AsyncSession) -> int:
-    """Получить общее количество заказов"""
-    result = await session.execute(select(func.count(Order.id)))
-    return result.scalar_one_or_none() or 0
-
-
-async def get_revenue_and_profit(session: AsyncSession) -> dict:
-    """Получить выручку и прибыль (прибыль = (цена - себестоимость) * кол-во + доставка)"""
-    # Получаем все завершенные заказы
-    result = await session.execute(
-        select(Order).where(Order.status.in_(['completed', 'processing']))
-    )
-    orders = result.scalars().all()
-    
-    total_revenue = 0.0
-    total_cost = 0.0
-    total_profit = 0.0
-    
-    for order in orders:
-        total_revenue += order.total_price
-        
-        # Получаем товары в заказе
-        items_result = await session.execute(
-            select(OrderItem).where(OrderItem.order_id == order.id)
-        )
-        items = items_result.scalars().all()
-        
-        order_profit = 0.0
-        for item in items:
-            product = await get_product_by_id(session, item.product_id)
-            if product:
-                model = await get_model_by_id(session, product.model_id)
-                if model:
-                    # Себестоимость за весь товар
-                    item_cost = model.cost_price * item.quantity
-                    total_cost += item_cost
-                    
-                    # Прибыль = (цена - себестоимость) * количество
-                    order_profit += (product.price - model.cost_price) * item.quantity
-        
-        # Добавляем доставку к прибыли (если есть)
-        if order.delivery_fee > 0:
-            order_profit += order.delivery_fee
-        
-        total_profit += order_profit
-    
-    return {
-        'revenue': total_revenue,
-        'cost': total_cost,
-        'profit': total_profit
-    }
-
-
-async def get_top_products(session: AsyncSession, limit: int = 5) -> List[dict]:
-    """Получить топ продаваемых товаров"""
-    result = await session.execute(
-        select(
-            OrderItem.product_id,
-            func.sum(OrderItem.quantity).label('total_sold')
-        ).group_by(OrderItem.product_id).order_by(func.sum(OrderItem.quantity).desc()).limit(limit)
-    )
-    
-    top_products = []
-    for row in result:
-        product = await get_product_by_id(session, row.product_id)
-        if product:
-            top_products.append({
-                'product': product,
-                'total_sold': row.total_sold
-            })
-    
-    return top_products
-
-
-# ==================== BOT SETTINGS ====================
-
-async def get_maintenance_mode(session: AsyncSession) -> bool:
-    """Проверить включен ли режим тех. работ"""
-    result = await session.execute(
-        select(BotSettings).where(BotSettings.setting_key == 'maintenance_mode')
-    )
-    setting = result.scalar_one_or_none()
-    
-    if not setting:
-        # Если настройка не найдена, создаем с выключенным режимом
-        setting = BotSettings(setting_key='maintenance_mode', setting_value='false')
-        session.add(setting)
-        await session.commit()
-        return False
-    
-    return setting.setting_value.lower() == 'true'
-
-
-async def set_maintenance_mode(session: AsyncSession, enabled: bool):
-    """Установить режим тех. работ"""
-    result = await session.execute(
-        select(BotSettings).where(BotSettings.setting_key == 'maintenance_mode')
-    )
-    setting = result.scalar_one_or_none()
-    
-    if setting:
-        setting.setting_value = 'true' if enabled else 'false'
-        setting.updated_at = datetime.utcnow()
-    else:
-        setting = BotSettings(
-            setting_key='maintenance_mode',
-            setting_value='true' if enabled else 'false'
-        )
-        session.add(setting)
-    
-    await session.commit()
+"""
+CRUD операции для работы с базой данных
+
+Частые чтения (пользователь, товар, корзина, настройки) обернуты в lambda_stmt:
+построенный запрос кэшируется по коду лямбды, и при повторных вызовах подставляются только параметры.
+Настройки бота (BotSettings) меняются редко, поэтому хранятся в памяти процесса (_settings_cache)
+и перечитываются из БД не чаще раза в SETTINGS_CACHE_TTL секунд; запись настройки сразу обновляет кэш
+"""
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update, delete, and_, func, case, lambda_stmt
+from sqlalchemy.orm import joinedload, selectinload, contains_eager, undefer, aliased
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .models import User, Model, Product, Cart, CartSummary, Order, OrderItem, BotSettings, OrderStatus, DeliveryMethod
+from typing import Optional, List
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# ==================== USERS ====================
+
+async def get_or_create_user(session: AsyncSession, telegram_id: int, username: Optional[str] = None, 
+                             first_name: Optional[str] = None, last_name: Optional[str] = None) -> User:
+    """Получить пользователя или создать нового, обновляет данные при каждом заходе"""
+    # Один upsert по уникальному telegram_id вместо SELECT + INSERT/UPDATE.
+    # Данные обновляются при каждом заходе (для отслеживания смены ника/имени)
+    stmt = sqlite_insert(User).values(
+        telegram_id=telegram_id,
+        username=username,
+        first_name=first_name,
+        last_name=last_name
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        set_={
+            'username': stmt.excluded.username,
+            'first_name': stmt.excluded.first_name,
+            'last_name': stmt.excluded.last_name,
+        }
+    ).returning(User)
+    
+    result = await session.execute(stmt, execution_options={'populate_existing': True})
+    user = result.scalar_one()
+    await session.commit()
+    
+    return user
+
+
+async def get_user_by_telegram_id(session: AsyncSession, telegram_id: int) -> Optional[User]:
+    """Получить пользователя по telegram_id"""
+    result = await session.execute(lambda_stmt(lambda: select(User).where(User.telegram_id == telegram_id)))
+    return result.scalar_one_or_none()
+
+
+# Кэш статуса бана: telegram_id -> (забанен ли, время устаревания).
+# Проверка бана идет на каждое действие пользователя; ban_user обновляет кэш сразу,
+# TTL ограничивает устаревание, если БД изменили в обход бота
+BAN_CACHE_TTL = 60
+BAN_CACHE_MAXSIZE = 10_000
+_ban_cache: dict = {}
+
+
+def _cache_ban_status(telegram_id: int, banned: bool):
+    """Положить статус бана в кэш"""
+    if len(_ban_cache) >= BAN_CACHE_MAXSIZE:
+        _ban_cache.clear()
+    _ban_cache[telegram_id] = (banned, time.monotonic() + BAN_CACHE_TTL)
+
+
+async def is_user_banned(session: AsyncSession, telegram_id: int) -> bool:
+    """Забанен ли пользователь (неизвестный пользователь не забанен)"""
+    cached = _ban_cache.get(telegram_id)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+    
+    result = await session.execute(
+        lambda_stmt(lambda: select(User.is_banned).where(User.telegram_id == telegram_id))
+    )
+    banned = bool(result.scalar_one_or_none())
+    _cache_ban_status(telegram_id, banned)
+    return banned
+
+
+async def ban_user(session: AsyncSession, user_id: int, ban: bool = True):
+    """Забанить/разбанить пользователя"""
+    result = await session.execute(
+        update(User).where(User.id == user_id).values(is_banned=ban).returning(User.telegram_id)
+    )
+    telegram_id = result.scalar_one_or_none()
+    await session.commit()
+    if telegram_id is not None:
+        _cache_ban_status(telegram_id, ban)
+
+
+async def get_all_users(session: AsyncSession) -> List[User]:
+    """Получить всех пользователей"""
+    result = await session.execute(select(User))
+    return result.scalars().all()
+
+
+async def get_users_by_usernames(session: AsyncSession, usernames) -> list:
+    """telegram_id и username пользователей с указанными username одним запросом (строки Core)"""
+    if not usernames:
+        return []
+    result = await session.execute(
+        select(User.telegram_id, User.username).where(User.username.in_(list(usernames)))
+    )
+    return result.all()
+
+
+async def get_users_list(session: AsyncSession, offset: int = 0, limit: Optional[int] = None) -> list:
+    """
+    Пользователи для списка в админке - только нужные колонки (строки Core, без ORM-объектов).
+    Новые первыми; offset/limit - страница списка (LIMIT/OFFSET в запросе)
+    """
+    result = await session.execute(
+        select(User.id, User.telegram_id, User.username, User.first_name, User.is_banned)
+        .order_by(User.id.desc())
+        .offset(offset)
+        .limit(limit)
+    )
+    return result.all()
+
+
+# ==================== MODELS ====================
+
+async def create_model(session: AsyncSession, name: str, description: Optional[str] = None, 
+                      image_path: Optional[str] = None, cost_price: int = 0) -> Model:
+    """Создать новую модель"""
+    model = Model(
+        name=name,
+        description=description,
+        image_path=image_path,
+        cost_price=cost_price
+    )
+    session.add(model)
+    # id и значения по умолчанию приходят через RETURNING (eager_defaults), refresh не нужен
+    await session.commit()
+    return model
+
+
+async def get_all_models(session: AsyncSession, available_only: bool = True) -> List[Model]:
+    """Получить все модели"""
+    query = select(Model)
+    if available_only:
+        query = query.where(Model.is_available == True)
+    
+    result = await session.execute(query)
+    return result.scalars().all()
+
+
+async def get_catalog_models(session: AsyncSession) -> list:
+    """Доступные модели для каталога - только id и name (строки Core, без ORM-объектов)"""
+    result = await session.execute(
+        lambda_stmt(lambda: select(Model.id, Model.name).where(Model.is_available == True))
+    )
+    return result.all()
+
+
+async def get_models_list(session: AsyncSession) -> list:
+    """Все модели для списков в админке - id, name и количество вкусов (строки Core, одним запросом)"""
+    result = await session.execute(
+        select(Model.id, Model.name, func.count(Product.id).label('products_count'))
+        .outerjoin(Product, Product.model_id == Model.id)
+        .group_by(Model.id)
+        .order_by(Model.id)
+    )
+    return result.all()
+
+
+async def get_model_by_id(session: AsyncSession, model_id: int, with_description: bool = False) -> Optional[Model]:
+    """Получить модель по ID (описание отложено - with_description=True подгружает его)"""
+    query = lambda_stmt(lambda: select(Model).where(Model.id == model_id))
+    if with_description:
+        query += lambda q: q.options(undefer(Model.description))
+    
+    result = await session.execute(query)
+    return result.scalar_one_or_none()
+
+
+async def get_model_with_products_count(session: AsyncSession, model_id: int, with_description: bool = False):
+    """
+    Модель вместе с количеством ее вкусов одним запросом (счетчик - скалярный подзапрос).
+    Возвращает строку (модель, количество) или None
+    """
+    products_count = (
+        select(func.count(Product.id)).where(Product.model_id == Model.id).scalar_subquery()
+    )
+    query = select(Model, products_count).where(Model.id == model_id)
+    if with_description:
+        query = query.options(undefer(Model.description))
+    
+    result = await session.execute(query)
+    return result.one_or_none()
+
+
+async def get_model_with_products(session: AsyncSession, model_id: int) -> Optional[Model]:
+    """Модель вместе со всеми ее вкусами (model.products подгружается selectinload)"""
+    result = await session.execute(
+        select(Model).options(selectinload(Model.products)).where(Model.id == model_id)
+    )
+    return result.scalar_one_or_none()
+
+
+async def update_model(session: AsyncSession, model_id: int, **kwargs) -> Optional[Model]:
+    """
+    Обновить модель одним UPDATE ... RETURNING (без предварительного SELECT).
+    Возвращает обновленную модель или None, если ее нет (без полей - ничего не делает)
+    """
+    if not kwargs:
+        return None
+    result = await session.execute(
+        update(Model)
+        .where(Model.id == model_id)
+        .values(**kwargs)
+        .returning(Model)
+        .options(undefer(Model.description))
+    )
+    model = result.scalar_one_or_none()
+    await session.commit()
+    return model
+
+
+async def delete_model(session: AsyncSession, model_id: int):
+    """Удалить модель (ее вкусы, позиции корзин и заказов удалит БД каскадом)"""
+    await session.execute(delete(Model).where(Model.id == model_id))
+    await session.commit()
+    clear_stats_cache()
+
+
+# ==================== PRODUCTS ====================
+
+async def create_product(session: AsyncSession, model_id: int, flavor_name: str, 
+                        price: int, stock_quantity: int = 0) -> Product:
+    """Создать новый продукт (вкус)"""
+    product = Product(
+        model_id=model_id,
+        flavor_name=flavor_name,
+        price=price,
+        stock_quantity=stock_quantity
+    )
+    session.add(product)
+    await session.commit()
+    return product
+
+
+async def get_products_by_model(session: AsyncSession, model_id: int, available_only: bool = True) -> List[Product]:
+    """Получить все вкусы для модели"""
+    query = lambda_stmt(lambda: select(Product).where(Product.model_id == model_id))
+    if available_only:
+        query += lambda q: q.where(and_(Product.is_available == True, Product.stock_quantity > 0))
+    
+    result = await session.execute(query)
+    return result.scalars().all()
+
+
+async def get_catalog_products(session: AsyncSession, model_id: int) -> list:
+    """Вкусы модели в наличии для каталога - только поля для кнопок (строки Core, без ORM-объектов)"""
+    result = await session.execute(lambda_stmt(
+        lambda: select(Product.id, Product.flavor_name, Product.price, Product.stock_quantity)
+        .where(Product.model_id == model_id, Product.is_available == True, Product.stock_quantity > 0)
+    ))
+    return result.all()
+
+
+async def get_product_by_id(session: AsyncSession, product_id: int, with_model: bool = False) -> Optional[Product]:
+    """Получить продукт по ID (with_model=True подгружает модель тем же запросом)"""
+    query = lambda_stmt(lambda: select(Product).where(Product.id == product_id))
+    if with_model:
+        query += lambda q: q.options(joinedload(Product.model))
+    
+    result = await session.execute(query)
+    return result.scalar_one_or_none()
+
+
+async def update_product(session: AsyncSession, product_id: int, **kwargs):
+    """
+    Обновить продукт одним UPDATE ... RETURNING (без предварительного SELECT).
+    Возвращает строку (продукт, название модели) или None, если продукта нет (без полей - ничего не делает)
+    """
+    if not kwargs:
+        return None
+    model_name = select(Model.name).where(Model.id == Product.model_id).scalar_subquery()
+    result = await session.execute(
+        update(Product)
+        .where(Product.id == product_id)
+        .values(**kwargs)
+        .returning(Product, model_name)
+    )
+    row = result.one_or_none()
+    await session.commit()
+    return row
+
+
+async def _change_stock(session: AsyncSession, changes: dict):
+    """Изменить склад сразу для нескольких товаров {product_id: +/- количество} одним UPDATE без commit
+    (остаток не уходит ниже нуля)"""
+    if not changes:
+        return
+    await session.execute(
+        update(Product)
+        .where(Product.id.in_(changes))
+        .values(stock_quantity=func.max(0, Product.stock_quantity + case(changes, value=Product.id)))
+    )
+
+
+async def update_stock(session: AsyncSession, product_id: int, quantity_change: int):
+    """Обновить количество на складе (+ или -)"""
+    await _change_stock(session, {product_id: quantity_change})
+    await session.commit()
+
+
+async def delete_product(session: AsyncSession, product_id: int):
+    """Удалить продукт (позиции корзин и заказов удалит БД каскадом)"""
+    await session.execute(delete(Product).where(Product.id == product_id))
+    await session.commit()
+    clear_stats_cache()
+
+
+# ==================== CART ====================
+
+async def add_to_cart(session: AsyncSession, user_id: int, product_id: int, quantity: int = 1) -> Cart:
+    """Добавить товар в корзину. Если товар уже есть - увеличивает количество."""
+    logger.info(f"add_to_cart вызвана: user_id={user_id}, product_id={product_id}, quantity={quantity}")
+    
+    # Один атомарный upsert по уникальному индексу (user_id, product_id) вместо SELECT + INSERT/UPDATE
+    stmt = sqlite_insert(Cart).values(user_id=user_id, product_id=product_id, quantity=quantity)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Cart.user_id, Cart.product_id],
+        set_={'quantity': Cart.quantity + stmt.excluded.quantity}
+    ).returning(Cart)
+    
+    result = await session.execute(stmt, execution_options={'populate_existing': True})
+    cart_item = result.scalar_one()
+    await session.commit()
+    logger.info(f"После commit: cart_item.id={cart_item.id}, quantity={cart_item.quantity}")
+    return cart_item
+
+
+async def get_user_cart(session: AsyncSession, user_id: int) -> List[Cart]:
+    """Получить корзину пользователя (вместе с товарами и моделями)"""
+    # Дубликатов (user_id, product_id) нет - их не допускает уникальный индекс
+    # Получаем корзину вместе с товарами и моделями одним запросом
+    result = await session.execute(lambda_stmt(
+        lambda: select(Cart)
+        .options(joinedload(Cart.product).joinedload(Product.model))
+        .where(Cart.user_id == user_id)
+        .order_by(Cart.id)
+    ))
+    return result.scalars().all()
+
+
+async def get_user_with_cart(session: AsyncSession, telegram_id: int) -> Optional[User]:
+    """Получить пользователя по telegram_id вместе с корзиной (товары и модели) одним запросом"""
+    result = await session.execute(
+        select(User)
+        .outerjoin(User.cart_items)
+        .outerjoin(Cart.product)
+        .outerjoin(Product.model)
+        .options(contains_eager(User.cart_items).contains_eager(Cart.product).contains_eager(Product.model))
+        .where(User.telegram_id == telegram_id)
+        .order_by(Cart.id)
+    )
+    return result.unique().scalar_one_or_none()
+
+
+async def get_cart_summary(session: AsyncSession, user_id: int) -> Optional[CartSummary]:
+    """Получить итоги корзины (кол-во позиций и сумму) без чтения самой корзины"""
+    result = await session.execute(lambda_stmt(lambda: select(CartSummary).where(CartSummary.user_id == user_id)))
+    return result.scalar_one_or_none()
+
+
+async def update_cart_item_quantity(session: AsyncSession, cart_id: int, quantity: int):
+    """Обновить количество товара в корзине"""
+    if quantity <= 0:
+        await session.execute(delete(Cart).where(Cart.id == cart_id))
+    else:
+        await session.execute(
+            update(Cart).where(Cart.id == cart_id).values(quantity=quantity)
+        )
+    await session.commit()
+
+
+async def remove_from_cart(session: AsyncSession, cart_id: int):
+    """Удалить товар из корзины"""
+    await session.execute(delete(Cart).where(Cart.id == cart_id))
+    await session.commit()
+
+
+async def clear_user_cart(session: AsyncSession, user_id: int):
+    """Очистить всю корзину пользователя"""
+    await session.execute(delete(Cart).where(Cart.user_id == user_id))
+    await session.commit()
+
+
+# ==================== ORDERS ====================
+
+async def create_order(session: AsyncSession, user_id: int, cart_items: List[Cart], 
+                      contact_info: Optional[str] = None, delivery_method: DeliveryMethod = DeliveryMethod.PICKUP, 
+                      delivery_fee: int = 0, merge_with_existing: bool = False) -> Order:
+    """Создать заказ из корзины (все изменения - одной транзакцией). 
+    
+    Args:
+        delivery_fee: Стоимость доставки в центах.
+        merge_with_existing: Если True, добавляет товары к существующему заказу со статусом PROCESSING.
+                            Если False (по умолчанию), всегда создает новый заказ.
+    """
+    # Перезапрашиваем корзину вместе с товарами одним запросом (ВАЖНО: переданный cart_items не используется).
+    # Дубликатов (user_id, product_id) в корзине быть не может - их исключает уникальный индекс
+    cart_query_result = await session.execute(
+        select(Cart, Product)
+        .join(Product, Product.id == Cart.product_id)
+        .where(Cart.user_id == user_id)
+        .order_by(Cart.id)
+    )
+    # В заказ попадают только доступные товары, которых хватает на складе
+    lines = [
+        (cart_item, product) for cart_item, product in cart_query_result
+        if product.is_available and product.stock_quantity >= cart_item.quantity
+    ]
+    
+    # Группируем по product_id + price (на случай если цена изменилась)
+    order_items_dict = {}
+    stock_changes = {}
+    for cart_item, product in lines:
+        key = (product.id, product.price)
+        if key in order_items_dict:
+            order_items_dict[key]['quantity'] += cart_item.quantity
+        else:
+            order_items_dict[key] = {
+                'product_id': product.id,
+                'quantity': cart_item.quantity,
+                'price_at_order': product.price
+            }
+        stock_changes[product.id] = stock_changes.get(product.id, 0) - cart_item.quantity
+    items_price = sum(item['price_at_order'] * item['quantity'] for item in order_items_dict.values())
+    
+    # Активный заказ "В процессе" нужен только для объединения - без merge_with_existing не запрашиваем
+    existing_order = None
+    if merge_with_existing:
+        result = await session.execute(
+            select(Order).where(
+                and_(Order.user_id == user_id, Order.status == OrderStatus.PROCESSING)
+            ).order_by(Order.created_at.desc()).limit(1).options(undefer(Order.contact_info))
+        )
+        existing_order = result.scalar_one_or_none()
+    
+    if existing_order:
+        # Добавляем товары к существующему заказу: его позиции читаем одним запросом
+        existing_items_result = await session.execute(
+            select(OrderItem).where(OrderItem.order_id == existing_order.id).order_by(OrderItem.id)
+        )
+        existing_items = {}
+        for item in existing_items_result.scalars():
+            existing_items.setdefault((item.product_id, item.price_at_order), []).append(item)
+        
+        new_items = []
+        for key, item_data in order_items_dict.items():
+            same_items = existing_items.get(key)
+            if same_items:
+                # Увеличиваем количество в первой записи, остальные дубликаты удаляем
+                same_items[0].quantity += item_data['quantity']
+                for duplicate in same_items[1:]:
+                    await session.delete(duplicate)
+            else:
+                new_items.append({'order_id': existing_order.id, **item_data})
+        
+        if new_items:
+            await session.execute(insert(OrderItem), new_items)
+        
+        # Обновляем общую сумму заказа
+        existing_order.total_price += items_price
+        order = existing_order
+    
+    else:
+        # Создаем новый заказ
+        logger.info(f"Создание нового заказа для user_id={user_id}, позиций={len(order_items_dict)}")
+        order = Order(
+            user_id=user_id,
+            total_price=items_price + delivery_fee,
+            contact_info=contact_info,
+            delivery_method=delivery_method,
+            delivery_fee=delivery_fee
+        )
+        session.add(order)
+        # id заказа нужен для позиций - flush без коммита
+        await session.flush()
+        
+        if order_items_dict:
+            await session.execute(
+                insert(OrderItem),
+                [{'order_id': order.id, **item_data} for item_data in order_items_dict.values()]
+            )
+    
+    # Списываем склад и очищаем корзину в той же транзакции
+    await _change_stock(session, stock_changes)
+    await session.execute(delete(Cart).where(Cart.user_id == user_id))
+    await session.commit()
+    clear_stats_cache()
+    
+    return order
+
+
+async def get_order_by_id(session: AsyncSession, order_id: int, with_contact: bool = False) -> Optional[Order]:
+    """Получить заказ по ID (контакт отложен - with_contact=True подгружает его)"""
+    query = select(Order).where(Order.id == order_id)
+    if with_contact:
+        query = query.options(undefer(Order.contact_info))
+    
+    result = await session.execute(query)
+    order = result.scalar_one_or_none()
+    return order
+
+
+async def _merge_order_item_duplicates(session: AsyncSession, order_id: Optional[int] = None) -> int:
+    """
+    Объединить дубликаты (заказ, товар, цена) двумя запросами без commit: первая запись группы
+    получает общее количество, остальные удаляются. order_id=None - во всех заказах.
+    Возвращает количество объединенных групп
+    """
+    group = (OrderItem.order_id, OrderItem.product_id, OrderItem.price_at_order)
+    first_ids = select(func.min(OrderItem.id)).group_by(*group)
+    if order_id is not None:
+        first_ids = first_ids.where(OrderItem.order_id == order_id)
+    
+    same = aliased(OrderItem)
+    group_quantity = select(func.sum(same.quantity)).where(
+        same.order_id == OrderItem.order_id,
+        same.product_id == OrderItem.product_id,
+        same.price_at_order == OrderItem.price_at_order
+    ).scalar_subquery()
+    
+    merged = await session.execute(
+        update(OrderItem)
+        .where(OrderItem.id.in_(first_ids.having(func.count() > 1)))
+        .values(quantity=group_quantity)
+        .execution_options(synchronize_session=False)
+    )
+    if not merged.rowcount:
+        return 0
+    
+    delete_stmt = delete(OrderItem).where(OrderItem.id.not_in(first_ids))
+    if order_id is not None:
+        delete_stmt = delete_stmt.where(OrderItem.order_id == order_id)
+    await session.execute(delete_stmt.execution_options(synchronize_session=False))
+    return merged.rowcount
+
+
+async def merge_duplicate_order_items(session: AsyncSession, order_id: int):
+    """Объединить дубликаты товаров в заказе"""
+    await _merge_order_item_duplicates(session, order_id)
+    await session.commit()
+
+
+async def fix_all_orders(session: AsyncSession) -> int:
+    """
+    Объединить дубликаты товаров во всех заказах и пересчитать суммы заказов.
+    Все делается в SQL: заказы и их товары в память не читаются.
+    Возвращает количество объединенных групп
+    """
+    merged = await _merge_order_item_duplicates(session)
+    
+    # Сумма заказа = товары + доставка; одним UPDATE только для заказов, где она разошлась
+    new_total = select(
+        func.coalesce(func.sum(OrderItem.quantity * OrderItem.price_at_order), 0)
+    ).where(OrderItem.order_id == Order.id).scalar_subquery() + Order.delivery_fee
+    await session.execute(
+        update(Order)
+        .where(Order.total_price != new_total)
+        .values(total_price=new_total)
+        .execution_options(synchronize_session=False)
+    )
+    
+    await session.commit()
+    clear_stats_cache()
+    return merged
+
+
+async def get_active_order(session: AsyncSession, user_id: int, with_items: bool = False) -> Optional[Order]:
+    """
+    Активный заказ пользователя (статус PROCESSING) или None.
+    with_items=True - позиции заказа (order.items) подгружаются сразу, одним запросом selectinload
+    """
+    query = (
+        select(Order)
+        .where(Order.user_id == user_id, Order.status == OrderStatus.PROCESSING)
+        .order_by(Order.created_at.desc())
+        .limit(1)
+    )
+    if with_items:
+        query = query.options(selectinload(Order.items))
+    
+    result = await session.execute(query)
+    return result.scalar_one_or_none()
+
+
+async def get_user_orders(session: AsyncSession, user_id: int) -> List[Order]:
+    """Получить все заказы пользователя"""
+    result = await session.execute(
+        select(Order).where(Order.user_id == user_id).order_by(Order.created_at.desc())
+    )
+    return result.scalars().all()
+
+
+async def get_orders_list(session: AsyncSession) -> list:
+    """Заказы для списка в админке вместе с именем пользователя (строки Core, одним запросом)"""
+    result = await session.execute(
+        select(Order.id, Order.status, Order.total_price, User.username, User.first_name)
+        .outerjoin(User, User.id == Order.user_id)
+        .order_by(Order.created_at.desc())
+    )
+    return result.all()
+
+
+async def get_order_lines(session: AsyncSession, order_id: int) -> list:
+    """Товары заказа вместе с названиями вкуса и модели (строки Core, одним запросом)"""
+    result = await session.execute(
+        select(OrderItem.quantity, OrderItem.price_at_order, Product.flavor_name, Model.name.label('model_name'))
+        .join(Product, Product.id == OrderItem.product_id)
+        .join(Model, Model.id == Product.model_id)
+        .where(OrderItem.order_id == order_id)
+        .order_by(OrderItem.id)
+    )
+    return result.all()
+
+
+async def update_order_status(session: AsyncSession, order_id: int, status: OrderStatus) -> Optional[Order]:
+    """Обновить статус заказа. Обновленный заказ (с контактом) возвращается тем же запросом через RETURNING"""
+    result = await session.execute(
+        update(Order)
+        .where(Order.id == order_id)
+        .values(status=status)
+        .returning(Order)
+        .options(undefer(Order.contact_info))
+    )
+    order = result.scalar_one_or_none()
+    await session.commit()
+    clear_stats_cache()
+    return order
+
+
+async def delete_order(session: AsyncSession, order_id: int):
+    """Удалить заказ и вернуть товары на склад"""
+    # Получаем заказ и его товары
+    order = await get_order_by_id(session, order_id)
+    if not order:
+        return False
+    
+    # Количество товаров в заказе по product_id (дубликаты позиций суммируются в SQL)
+    items_result = await session.execute(
+        select(OrderItem.product_id, func.sum(OrderItem.quantity))
+        .where(OrderItem.order_id == order_id)
+        .group_by(OrderItem.product_id)
+    )
+    
+    # Возвращаем товары на склад одним UPDATE
+    await _change_stock(session, dict(items_result.all()))
+    
+    # Удаляем заказ (OrderItems удалит БД: ON DELETE CASCADE)
+    await session.execute(delete(Order).where(Order.id == order_id))
+    await session.commit()
+    clear_stats_cache()
+    return True
+
+
+async def clear_orders_and_carts(session: AsyncSession):
+    """Удалить все корзины и заказы одной транзакцией (модели и товары остаются)"""
+    # Дочерние таблицы первыми: каскаду ON DELETE при удалении заказов нечего обходить
+    await session.execute(delete(Cart))
+    await session.execute(delete(OrderItem))
+    await session.execute(delete(Order))
+    await session.commit()
+    clear_stats_cache()
+
+
+# ==================== BOT SETTINGS ====================
+
+# Кэш настроек бота: ключ -> (значение, время устаревания); значение None - настройки нет в БД.
+# TTL ограничивает устаревание, если БД изменили в обход бота
+SETTINGS_CACHE_TTL = 30
+_settings_cache: dict = {}
+
+
+def _cache_setting(key: str, value: Optional[str]):
+    """Положить значение настройки в кэш"""
+    _settings_cache[key] = (value, time.monotonic() + SETTINGS_CACHE_TTL)
+
+
+def clear_settings_cache():
+    """Сбросить кэш настроек (например, после замены файла БД)"""
+    _settings_cache.clear()
+
+
+async def get_setting(session: AsyncSession, key: str) -> Optional[str]:
+    """Получить настройку бота"""
+    cached = _settings_cache.get(key)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+    
+    result = await session.execute(
+        lambda_stmt(lambda: select(BotSettings.setting_value).where(BotSettings.setting_key == key))
+    )
+    value = result.scalar_one_or_none()
+    _cache_setting(key, value)
+    return value
+
+
+async def update_setting(session: AsyncSession, key: str, value: str):
+    """Обновить настройку бота (один upsert по уникальному setting_key)"""
+    stmt = sqlite_insert(BotSettings).values(setting_key=key, setting_value=value)
+    await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[BotSettings.setting_key],
+            set_={'setting_value': stmt.excluded.setting_value, 'updated_at': func.now()}
+        )
+    )
+    await session.commit()
+    _cache_setting(key, value)
+
+
+# ==================== STATISTICS ====================
+
+# Кэш статистики для админ-панели: имя -> (значение, время устаревания).
+# Сбрасывается при изменении заказов (clear_stats_cache), остальное догоняет TTL
+STATS_CACHE_TTL = 10
+_stats_cache: dict = {}
+
+
+def clear_stats_cache():
+    """Сбросить кэш статистики (после изменения заказов)"""
+    _stats_cache.clear()
+
+
+async def _cached_stat(name: str, compute):
+    """Вернуть значение статистики из кэша или посчитать его через compute()"""
+    cached = _stats_cache.get(name)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+    
+    value = await compute()
+    _stats_cache[name] = (value, time.monotonic() + STATS_CACHE_TTL)
+    return value
+
+
+async def get_total_revenue(session: AsyncSession) -> int:
+    """Получить общую выручку (в центах)"""
+    async def compute():
+        result = await session.execute(
+            select(func.sum(Order.total_price)).where(Order.status.in_([OrderStatus.COMPLETED, OrderStatus.PROCESSING]))
+        )
+        return result.scalar_one() or 0
+    
+    return await _cached_stat('revenue', compute)
+
+
+async def get_total_orders_count(session: AsyncSession) -> int:
+    """Получить общее количество заказов"""
+    async def compute():
+        result = await session.execute(select(func.count()).select_from(Order))
+        return result.scalar_one() or 0
+    
+    return await _cached_stat('orders_count', compute)
+
+
+async def get_total_users_count(session: AsyncSession) -> int:
+    """Получить общее количество пользователей"""
+    async def compute():
+        result = await session.execute(select(func.count()).select_from(User))
+        return result.scalar_one() or 0
+    
+    return await _cached_stat('users_count', compute)
+
+
+async def get_revenue_and_profit(session: AsyncSession) -> dict:
+    """Получить выручку, себестоимость и прибыль в центах (прибыль = (цена в заказе - себестоимость) * кол-во + доставка)"""
+    async def compute():
+        active = Order.status.in_([OrderStatus.COMPLETED, OrderStatus.PROCESSING])
+        
+        # Выручку и доставку считаем по заказам отдельными подзапросами, чтобы JOIN с товарами не размножал строки заказа
+        revenue = select(func.coalesce(func.sum(Order.total_price), 0)).where(active).scalar_subquery()
+        delivery = select(func.coalesce(func.sum(Order.delivery_fee), 0)).where(active).scalar_subquery()
+        
+        # Все считается одним запросом (товары без продукта/модели не учитываются)
+        result = await session.execute(
+            select(
+                revenue,
+                delivery,
+                func.coalesce(func.sum(Model.cost_price * OrderItem.quantity), 0),
+                func.coalesce(func.sum((OrderItem.price_at_order - Model.cost_price) * OrderItem.quantity), 0)
+            )
+            .select_from(OrderItem)
+            .join(Order, Order.id == OrderItem.order_id)
+            .join(Product, Product.id == OrderItem.product_id)
+            .join(Model, Model.id == Product.model_id)
+            .where(active)
+        )
+        total_revenue, total_delivery, total_cost, items_profit = result.one()
+        
+        return {
+            'revenue': total_revenue,
+            'cost': total_cost,
+            'profit': items_profit + total_delivery
+        }
+    
+    return await _cached_stat('revenue_and_profit', compute)
+
+
+async def get_top_products(session: AsyncSession, limit: int = 5) -> List[dict]:
+    """Получить топ продаваемых товаров (товар приходит вместе с моделью)"""
+    total_sold = func.sum(OrderItem.quantity).label('total_sold')
+    result = await session.execute(
+        select(Product, total_sold)
+        .join(OrderItem, OrderItem.product_id == Product.id)
+        .options(joinedload(Product.model))
+        .group_by(OrderItem.product_id)
+        .order_by(total_sold.desc())
+        .limit(limit)
+    )
+    
+    return [{'product': product, 'total_sold': sold} for product, sold in result.all()]
+
+
+# ==================== BOT SETTINGS ====================
+
+async def get_maintenance_mode(session: AsyncSession) -> bool:
+    """Проверить включен ли режим тех. работ"""
+    value = await get_setting(session, 'maintenance_mode')
+    
+    if value is None:
+        # Если настройка не найдена, создаем с выключенным режимом
+        await update_setting(session, 'maintenance_mode', 'false')
+        return False
+    
+    return value.lower() == 'true'
+
+
+async def set_maintenance_mode(session: AsyncSession, enabled: bool):
+    """Установить режим тех. работ"""
+    await update_setting(session, 'maintenance_mode', 'true' if enabled else 'false')
\ No newline at end of file
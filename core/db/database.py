@@ -1,68 +1,264 @@
-"""
-Подключение к базе данных и функции инициализации
-"""
-
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy import select
-from .models import Base, User, Model, Product, Cart, Order, OrderItem, BotSettings
-from datetime import datetime
-import os
-
-
-# Получаем имя БД из .env
-DB_NAME = os.getenv('DB_NAME', 'cloud_supply.db')
-DB_PATH = os.path.join(os.path.dirname(__file__), DB_NAME)
-
-# Создаем асинхронный движок
-DATABASE_URL = f"sqlite+aiosqlite:///{DB_PATH}"
-engine = create_async_engine(DATABASE_URL, echo=False)
-
-# Создаем фабрику сессий
-async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-
-
-async def init_db():
-    """
-    Инициализация базы данных - создание всех таблиц
-    """
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    
-    # Создаем дефолтные настройки бота
-    async with async_session_maker() as session:
-        # Проверяем есть ли настройки
-        result = await session.execute(select(BotSettings).where(BotSettings.setting_key == 'welcome_message'))
-        existing = result.scalar_one_or_none()
-        
-        if not existing:
-            # Создаем дефолтные настройки
-            default_settings = [
-                BotSettings(
-                    setting_key='welcome_message',
-                    setting_value='☁️ Добро пожаловать в Cloud Supply!\n\nВыберите модель вейпа и наслаждайтесь лучшими вкусами! 💨'
-                ),
-                BotSettings(
-                    setting_key='support_message',
-                    setting_value='📞 Свяжитесь с поддержкой Cloud Supply: @cloud_supplier'
-                )
-            ]
-            
-            session.add_all(default_settings)
-            await session.commit()
-    
-    print("✅ База данных инициализирована!")
-
-
-async def get_session() -> AsyncSession:
-    """
-    Получить сессию для работы с БД
-    """
-    return async_session_maker()
-
-
-async def close_db():
-    """
-    Закрыть соединение с БД
-    """
-    await engine.dispose()
-    print("✅ Соединение с БД закрыто!")
+"""
+Подключение к базе данных и функции инициализации
+"""
+
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy import select, event, inspect
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from .models import Base, User, Model, Product, Cart, Order, OrderItem, BotSettings, CartSummary
+from .migrations import run_migrations
+from datetime import datetime
+import asyncio
+import sqlite3
+import os
+
+
+# Получаем имя БД из .env
+DB_NAME = os.getenv('DB_NAME', 'cloud_supply.db')
+DB_PATH = os.path.join(os.path.dirname(__file__), DB_NAME)
+
+# Размеры пула соединений (можно переопределить в .env)
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '20'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+
+# Создаем асинхронный движок
+# Пул держит открытые соединения, чтобы всплески callback'ов не открывали файл БД заново на каждый запрос
+DATABASE_URL = f"sqlite+aiosqlite:///{DB_PATH}"
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_recycle=1800,
+    query_cache_size=1200,
+)
+
+# Настройки SQLite для каждого нового соединения:
+# WAL + synchronous=NORMAL убирают двойной fsync на каждую запись в корзину
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+    'mmap_size': 268435456,
+    'cache_size': -65536,
+    # Каскадное удаление (ON DELETE CASCADE) работает только с включенными внешними ключами
+    'foreign_keys': 'ON',
+}
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Применить SQLITE_PRAGMAS к новому соединению"""
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+# Создаем фабрику сессий
+async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def _merge_duplicate_cart_rows(conn):
+    """Схлопнуть дубликаты (user_id, product_id) в корзинах перед созданием уникального индекса"""
+    await conn.exec_driver_sql("""
+        UPDATE cart SET quantity = (
+            SELECT SUM(c2.quantity) FROM cart AS c2
+            WHERE c2.user_id = cart.user_id AND c2.product_id = cart.product_id
+        )
+        WHERE id IN (SELECT MIN(id) FROM cart GROUP BY user_id, product_id HAVING COUNT(*) > 1)
+    """)
+    await conn.exec_driver_sql(
+        "DELETE FROM cart WHERE id NOT IN (SELECT MIN(id) FROM cart GROUP BY user_id, product_id)"
+    )
+    # Прежний неуникальный индекс заменен на uq_cart_user_product
+    await conn.exec_driver_sql("DROP INDEX IF EXISTS ix_cart_user_product")
+
+
+def _create_missing_indexes(sync_conn):
+    """Создать индексы, которых еще нет в существующей БД"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+
+def _cart_summary_refresh_sql(users_sql: str) -> str:
+    """SQL пересчета итогов корзины для пользователей из users_sql (должен вернуть колонку user_id)"""
+    return f"""
+        INSERT INTO cart_summary (user_id, line_count, subtotal, updated_at)
+        SELECT u.user_id,
+               (SELECT COUNT(*) FROM cart JOIN products ON products.id = cart.product_id
+                WHERE cart.user_id = u.user_id),
+               (SELECT COALESCE(SUM(cart.quantity * products.price), 0) FROM cart JOIN products ON products.id = cart.product_id
+                WHERE cart.user_id = u.user_id),
+               CURRENT_TIMESTAMP
+        FROM ({users_sql}) AS u WHERE true
+        ON CONFLICT(user_id) DO UPDATE SET
+            line_count = excluded.line_count,
+            subtotal = excluded.subtotal,
+            updated_at = excluded.updated_at;
+    """
+
+
+# Триггеры, поддерживающие cart_summary: (имя, событие, пользователи для пересчета)
+CART_SUMMARY_TRIGGERS = [
+    ('trg_cart_summary_insert', 'AFTER INSERT ON cart', 'SELECT NEW.user_id AS user_id'),
+    ('trg_cart_summary_update', 'AFTER UPDATE ON cart',
+     'SELECT NEW.user_id AS user_id UNION SELECT OLD.user_id'),
+    ('trg_cart_summary_delete', 'AFTER DELETE ON cart', 'SELECT OLD.user_id AS user_id'),
+    ('trg_cart_summary_price', 'AFTER UPDATE OF price ON products',
+     'SELECT DISTINCT user_id FROM cart WHERE product_id = NEW.id'),
+    ('trg_cart_summary_product_delete', 'AFTER DELETE ON products',
+     'SELECT DISTINCT user_id FROM cart WHERE product_id = OLD.id'),
+]
+
+
+async def _create_cart_summary_triggers(conn):
+    """Пересоздать триггеры cart_summary и пересчитать итоги для всех корзин"""
+    for name, event, users_sql in CART_SUMMARY_TRIGGERS:
+        await conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+        await conn.exec_driver_sql(
+            f"CREATE TRIGGER {name} {event} BEGIN {_cart_summary_refresh_sql(users_sql)} END"
+        )
+    
+    await conn.exec_driver_sql("DELETE FROM cart_summary")
+    await conn.exec_driver_sql(_cart_summary_refresh_sql("SELECT DISTINCT user_id FROM cart"))
+
+
+async def init_db():
+    """
+    Инициализация базы данных - создание всех таблиц
+    """
+    async with engine.connect() as conn:
+        # PRAGMA foreign_keys не действует внутри транзакции - выключаем до ее начала:
+        # при пересоздании таблиц в миграциях DROP TABLE иначе каскадно удалит дочерние строки
+        await conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        await conn.commit()
+        
+        async with conn.begin():
+            fresh = not await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table('users'))
+            await conn.run_sync(Base.metadata.create_all)
+            # Изменения существующих таблиц (новая БД сразу создается по текущей схеме)
+            await conn.run_sync(run_migrations, fresh)
+            await _merge_duplicate_cart_rows(conn)
+            # create_all не трогает уже существующие таблицы - добавляем недостающие индексы отдельно
+            await conn.run_sync(_create_missing_indexes)
+            await _create_cart_summary_triggers(conn)
+        
+        await conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+        await conn.commit()
+    
+    # Создаем дефолтные настройки бота
+    async with async_session_maker() as session:
+        # Проверяем есть ли настройки
+        result = await session.execute(select(BotSettings).where(BotSettings.setting_key == 'welcome_message'))
+        existing = result.scalar_one_or_none()
+        
+        if not existing:
+            # Создаем дефолтные настройки
+            default_settings = [
+                BotSettings(
+                    setting_key='welcome_message',
+                    setting_value='☁️ Добро пожаловать в Cloud Supply!\n\nВыберите модель вейпа и наслаждайтесь лучшими вкусами! 💨'
+                ),
+                BotSettings(
+                    setting_key='support_message',
+                    setting_value='📞 Свяжитесь с поддержкой Cloud Supply: @cloud_supplier'
+                )
+            ]
+            
+            session.add_all(default_settings)
+            await session.commit()
+    
+    print("✅ База данных инициализирована!")
+
+
+async def get_sqlite_pragmas() -> dict:
+    """
+    Текущие значения SQLITE_PRAGMAS (для логирования при запуске)
+    """
+    values = {}
+    async with engine.connect() as conn:
+        for name in SQLITE_PRAGMAS:
+            result = await conn.exec_driver_sql(f"PRAGMA {name}")
+            values[name] = result.scalar()
+    return values
+
+
+async def checkpoint_db():
+    """
+    Перенести изменения из WAL-журнала в основной файл БД (перед копированием файла для бэкапа)
+    """
+    async with engine.connect() as conn:
+        await conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def _backup_into(target: sqlite3.Connection):
+    """Скопировать БД в соединение target через online backup API SQLite (учитывает WAL, не блокирует писателей)"""
+    source = sqlite3.connect(DB_PATH)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+
+
+def _snapshot_db_sync() -> bytes:
+    """Снимок БД в памяти"""
+    snapshot = sqlite3.connect(':memory:')
+    try:
+        _backup_into(snapshot)
+        return snapshot.serialize()
+    finally:
+        snapshot.close()
+
+
+def _backup_db_sync(backup_path: str):
+    """Копия БД в файл (папка создается при необходимости)"""
+    os.makedirs(os.path.dirname(backup_path), exist_ok=True)
+    backup = sqlite3.connect(backup_path)
+    try:
+        _backup_into(backup)
+    finally:
+        backup.close()
+
+
+async def snapshot_db() -> bytes:
+    """
+    Согласованная копия БД в памяти для отправки бэкапа.
+    Чтение файла идет в отдельном потоке, чтобы не блокировать event loop
+    """
+    return await asyncio.to_thread(_snapshot_db_sync)
+
+
+async def backup_db(backup_path: str):
+    """
+    Согласованная копия БД в файл backup_path.
+    Копирование идет в отдельном потоке, чтобы не блокировать event loop
+    """
+    await asyncio.to_thread(_backup_db_sync, backup_path)
+
+
+async def warm_up_pool(connections: int = DB_POOL_SIZE):
+    """
+    Заранее открыть соединения пула, чтобы первые запросы не тратили время на подключение
+    """
+    async def _touch():
+        async with engine.connect() as conn:
+            await conn.exec_driver_sql("SELECT 1")
+    
+    await asyncio.gather(*(_touch() for _ in range(connections)))
+
+
+async def get_session() -> AsyncSession:
+    """
+    Получить сессию для работы с БД
+    """
+    return async_session_maker()
+
+
+async def close_db():
+    """
+    Закрыть соединение с БД
+    """
+    await engine.dispose()
+    print("✅ Соединение с БД закрыто!")
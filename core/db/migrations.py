@@ -0,0 +1,150 @@
+"""
+Миграции схемы SQLite
+
+create_all создает только недостающие таблицы и не меняет существующие, поэтому
+изменения колонок (DEFAULT, тип, внешние ключи) переносятся на старые БД здесь.
+Версия схемы хранится в PRAGMA user_version.
+
+Каждая миграция - словарь {таблица: {колонка: SQL-выражение от старых колонок}}.
+Таблицы из миграции пересоздаются по текущему описанию моделей (порядок из
+документации SQLite: новая таблица -> копирование данных -> DROP -> RENAME).
+Колонки без выражения копируются как есть, отсутствующие в старой таблице
+получают значение по умолчанию. Индексы и триггеры init_db создает после миграций.
+Миграции идут при выключенных внешних ключах (см. init_db): иначе DROP TABLE
+каскадно удалит строки дочерних таблиц.
+"""
+
+from sqlalchemy.schema import CreateTable
+from .models import Base
+
+
+# Миграции по порядку: версия схемы = номер миграции
+MIGRATIONS = [
+    # 1: created_at/updated_at получают DEFAULT CURRENT_TIMESTAMP на стороне БД
+    {
+        'users': {},
+        'models': {},
+        'products': {},
+        'cart': {},
+        'cart_summary': {},
+        'orders': {},
+        'bot_settings': {},
+    },
+    # 2: orders.status / orders.delivery_method - SmallInteger (OrderStatus / DeliveryMethod) вместо строк
+    {
+        'orders': {
+            'status': "CASE status WHEN 'processing' THEN 0 WHEN 'completed' THEN 1 ELSE status END",
+            'delivery_method': "CASE delivery_method WHEN 'pickup' THEN 0 WHEN 'delivery' THEN 1 ELSE delivery_method END",
+        },
+    },
+    # 3: внешние ключи с ON DELETE CASCADE (дочерние строки удаляет БД)
+    {
+        'products': {},
+        'cart': {},
+        'cart_summary': {},
+        'orders': {},
+        'order_items': {},
+    },
+    # 4: цены и суммы - целые центы вместо Float
+    {
+        'models': {'cost_price': "CAST(ROUND(cost_price * 100) AS INTEGER)"},
+        'products': {'price': "CAST(ROUND(price * 100) AS INTEGER)"},
+        'cart_summary': {'subtotal': "CAST(ROUND(subtotal * 100) AS INTEGER)"},
+        'orders': {
+            'total_price': "CAST(ROUND(total_price * 100) AS INTEGER)",
+            'delivery_fee': "CAST(ROUND(delivery_fee * 100) AS INTEGER)",
+        },
+        'order_items': {'price_at_order': "CAST(ROUND(price_at_order * 100) AS INTEGER)"},
+    },
+    # 5: models.photo_file_id - file_id фото модели в Telegram
+    {
+        'models': {},
+    },
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def get_schema_version(sync_conn) -> int:
+    """Текущая версия схемы БД"""
+    return sync_conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def set_schema_version(sync_conn, version: int):
+    """Записать версию схемы БД"""
+    sync_conn.exec_driver_sql(f"PRAGMA user_version = {int(version)}")
+
+
+def _rebuild_table(sync_conn, table, conversions: dict):
+    """Пересоздать таблицу по текущей модели, перенеся данные"""
+    new_name = f"_new_{table.name}"
+    ddl = str(CreateTable(table).compile(dialect=sync_conn.dialect))
+    ddl = ddl.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {new_name} ", 1)
+    sync_conn.exec_driver_sql(ddl)
+    
+    old_columns = {row[1] for row in sync_conn.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+    
+    target, source = [], []
+    for column in table.columns:
+        if column.name in conversions:
+            target.append(column.name)
+            source.append(conversions[column.name])
+        elif column.name in old_columns:
+            target.append(column.name)
+            source.append(column.name)
+    
+    sync_conn.exec_driver_sql(
+        f"INSERT INTO {new_name} ({', '.join(target)}) SELECT {', '.join(source)} FROM {table.name}"
+    )
+    sync_conn.exec_driver_sql(f"DROP TABLE {table.name}")
+    sync_conn.exec_driver_sql(f"ALTER TABLE {new_name} RENAME TO {table.name}")
+
+
+def _delete_orphan_rows(sync_conn) -> int:
+    """
+    Удалить строки, нарушающие внешние ключи (остались от удалений без каскада).
+    Повторяем, пока есть нарушения: удаление заказа-сироты оставляет сиротами его товары
+    """
+    removed = 0
+    while True:
+        violations = sync_conn.exec_driver_sql("PRAGMA foreign_key_check").all()
+        if not violations:
+            return removed
+        rows = {(table_name, rowid) for table_name, rowid, _parent, _fkid in violations}
+        for table_name, rowid in rows:
+            sync_conn.exec_driver_sql(f"DELETE FROM {table_name} WHERE rowid = ?", (rowid,))
+        removed += len(rows)
+
+
+def run_migrations(sync_conn, fresh: bool = False):
+    """
+    Довести схему БД до SCHEMA_VERSION.
+    fresh=True - таблицы только что созданы create_all по текущим моделям, мигрировать нечего
+    """
+    version = get_schema_version(sync_conn)
+    if fresh or version >= SCHEMA_VERSION:
+        if version < SCHEMA_VERSION:
+            set_schema_version(sync_conn, SCHEMA_VERSION)
+        return
+    
+    # Собираем все ожидающие миграции: каждая таблица пересоздается один раз
+    pending = {}
+    for migration in MIGRATIONS[version:]:
+        for table_name, conversions in migration.items():
+            pending.setdefault(table_name, {}).update(conversions)
+    
+    # Триггеры ссылаются на пересоздаваемые таблицы - init_db создаст их заново
+    triggers = sync_conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'trigger'").scalars().all()
+    for name in triggers:
+        sync_conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+    
+    for table in Base.metadata.sorted_tables:
+        if table.name in pending:
+            _rebuild_table(sync_conn, table, pending[table.name])
+    
+    removed = _delete_orphan_rows(sync_conn)
+    if removed:
+        print(f"🧹 Удалено строк без родительской записи: {removed}")
+    
+    set_schema_version(sync_conn, SCHEMA_VERSION)
+    print(f"✅ Схема БД обновлена: версия {version} -> {SCHEMA_VERSION}")
\ No newline at end of file
@@ -1,155 +1,236 @@
-"""
-SQLAlchemy модели для Cloud Supply Bot
-
-Структура БД:
-1. Users - пользователи бота (telegram_id, username, is_banned)
-2. Models - модели вейпов (название, описание, картинка, себестоимость)
-3. Products - вкусы для моделей (привязка к модели, цена, количество на складе)
-4. Cart - корзина пользователей (связь user-product-quantity)
-5. Orders - заказы (user_id, статус, общая цена, контактные данные)
-6. OrderItems - товары в заказе (связь order-product с количеством и ценой на момент заказа)
-7. BotSettings - настройки бота (приветственное сообщение и т.д.)
-"""
-
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy import String, Integer, Float, DateTime, ForeignKey, Boolean, Text, BigInteger
-from datetime import datetime
-from typing import List, Optional
-import os
-
-
-# Базовый класс для всех моделей
-class Base(DeclarativeBase):
-    pass
-
-
-# Пользователи
-class User(Base):
-    __tablename__ = 'users'
-    
-    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    telegram_id: Mapped[int] = mapped_column(BigInteger, unique=True, nullable=False)
-    username: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
-    first_name: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
-    last_name: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
-    is_banned: Mapped[bool] = mapped_column(Boolean, default=False)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    
-    # Связи
-    cart_items: Mapped[List["Cart"]] = relationship("Cart", back_populates="user", cascade="all, delete-orphan")
-    orders: Mapped[List["Order"]] = relationship("Order", back_populates="user", cascade="all, delete-orphan")
-    
-    def __repr__(self):
-        return f"<User(id={self.id}, telegram_id={self.telegram_id}, username={self.username})>"
-
-
-# Модели вейпов (Elf Bar, HQD и т.д.)
-class Model(Base):
-    __tablename__ = 'models'
-    
-    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    name: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
-    description: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
-    image_path: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)  # Путь к картинке модели
-    cost_price: Mapped[float] = mapped_column(Float, default=0.0)  # Себестоимость для расчета revenue
-    is_available: Mapped[bool] = mapped_column(Boolean, default=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    
-    # Связи
-    products: Mapped[List["Product"]] = relationship("Product", back_populates="model", cascade="all, delete-orphan")
-    
-    def __repr__(self):
-        return f"<Model(id={self.id}, name={self.name})>"
-
-
-# Вкусы (привязаны к моделям)
-class Product(Base):
-    __tablename__ = 'products'
-    
-    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    model_id: Mapped[int] = mapped_column(ForeignKey('models.id'), nullable=False)
-    flavor_name: Mapped[str] = mapped_column(String(255), nullable=False)
-    price: Mapped[float] = mapped_column(Float, nullable=False)
-    stock_quantity: Mapped[int] = mapped_column(Integer, default=0)  # Количество на складе
-    is_available: Mapped[bool] = mapped_column(Boolean, default=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    
-    # Связи
-    model: Mapped["Model"] = relationship("Model", back_populates="products")
-    cart_items: Mapped[List["Cart"]] = relationship("Cart", back_populates="product", cascade="all, delete-orphan")
-    order_items: Mapped[List["OrderItem"]] = relationship("OrderItem", back_populates="product")
-    
-    def __repr__(self):
-        return f"<Product(id={self.id}, model_id={self.model_id}, flavor={self.flavor_name}, price={self.price})>"
-
-
-# Корзина
-class Cart(Base):
-    __tablename__ = 'cart'
-    
-    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=False)
-    product_id: Mapped[int] = mapped_column(ForeignKey('products.id'), nullable=False)
-    quantity: Mapped[int] = mapped_column(Integer, default=1)
-    added_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    
-    # Связи
-    user: Mapped["User"] = relationship("User", back_populates="cart_items")
-    product: Mapped["Product"] = relationship("Product", back_populates="cart_items")
-    
-    def __repr__(self):
-        return f"<Cart(user_id={self.user_id}, product_id={self.product_id}, quantity={self.quantity})>"
-
-
-# Заказы
-class Order(Base):
-    __tablename__ = 'orders'
-    
-    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=False)
-    total_price: Mapped[float] = mapped_column(Float, nullable=False)
-    status: Mapped[str] = mapped_column(String(50), default='processing')  # processing (в процессе), completed (готов)
-    delivery_method: Mapped[str] = mapped_column(String(50), default='pickup')  # pickup (самовывоз), delivery (доставка +5€)
-    delivery_fee: Mapped[float] = mapped_column(Float, default=0.0)  # Стоимость доставки
-    contact_info: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # Telegram username или другие контакты
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    
-    # Связи
-    user: Mapped["User"] = relationship("User", back_populates="orders")
-    items: Mapped[List["OrderItem"]] = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
-    
-    def __repr__(self):
-        return f"<Order(id={self.id}, user_id={self.user_id}, total={self.total_price}, status={self.status})>"
-
-
-# Товары в заказе
-class OrderItem(Base):
-    __tablename__ = 'order_items'
-    
-    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    order_id: Mapped[int] = mapped_column(ForeignKey('orders.id'), nullable=False)
-    product_id: Mapped[int] = mapped_column(ForeignKey('products.id'), nullable=False)
-    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
-    price_at_order: Mapped[float] = mapped_column(Float, nullable=False)  # Цена на момент заказа
-    
-    # Связи
-    order: Mapped["Order"] = relationship("Order", back_populates="items")
-    product: Mapped["Product"] = relationship("Product", back_populates="order_items")
-    
-    def __repr__(self):
-        return f"<OrderItem(order_id={self.order_id}, product_id={self.product_id}, qty={self.quantity})>"
-
-
-# Настройки бота (приветственное сообщение и т.д.)
-class BotSettings(Base):
-    __tablename__ = 'bot_settings'
-    
-    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    setting_key: Mapped[str] = mapped_column(String(100), unique=True, nullable=False)
-    setting_value: Mapped[str] = mapped_column(Text, nullable=False)
-    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    
-    def __repr__(self):
+"""
+SQLAlchemy модели для Cloud Supply Bot
+
+Структура БД:
+1. Users - пользователи бота (telegram_id, username, is_banned)
+2. Models - модели вейпов (название, описание, картинка, себестоимость)
+3. Products - вкусы для моделей (привязка к модели, цена, количество на складе)
+4. Cart - корзина пользователей (связь user-product-quantity)
+5. Orders - заказы (user_id, статус и способ получения - числа OrderStatus/DeliveryMethod, общая цена, контактные данные)
+6. OrderItems - товары в заказе (связь order-product с количеством и ценой на момент заказа)
+7. BotSettings - настройки бота (приветственное сообщение и т.д.)
+8. CartSummary - итоги корзины пользователя (поддерживаются триггерами, см. database.py)
+
+Связи не подгружаются неявно (lazy="raise_on_sql"): нужные связи явно
+подгружаются в запросе через selectinload/joinedload, чтобы не было N+1.
+Цены и суммы хранятся целыми центами (euros/to_cents - перевод на границе ввода/вывода).
+Время создания/изменения проставляет сама БД (DEFAULT CURRENT_TIMESTAMP, см. migrations.py).
+Длинные текстовые поля (Model.description, Order.contact_info) отложены (deferred):
+в списках они не читаются, а там, где нужны, подгружаются через undefer (см. crud.py).
+Дочерние строки удаляет сама БД (внешние ключи ON DELETE CASCADE, passive_deletes=True):
+ORM не подгружает коллекции перед удалением родителя.
+"""
+
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy import String, Integer, SmallInteger, DateTime, ForeignKey, Boolean, Text, BigInteger, Index, func
+from sqlalchemy.types import TypeDecorator
+from datetime import datetime
+from enum import IntEnum
+from typing import List, Optional
+import os
+
+
+# Статус заказа (хранится в БД числом)
+class OrderStatus(IntEnum):
+    PROCESSING = 0  # В процессе
+    COMPLETED = 1  # Готов
+
+
+# Способ получения заказа (хранится в БД числом)
+class DeliveryMethod(IntEnum):
+    PICKUP = 0  # Самовывоз
+    DELIVERY = 1  # Доставка +5€
+
+
+# Перечисление, хранящееся в БД числом SmallInteger (при чтении возвращается член перечисления, а не int)
+class IntEnumType(TypeDecorator):
+    impl = SmallInteger
+    cache_ok = True
+    
+    def __init__(self, enum_cls):
+        super().__init__()
+        self.enum_cls = enum_cls
+    
+    def process_bind_param(self, value, dialect):
+        return None if value is None else int(value)
+    
+    def process_result_value(self, value, dialect):
+        return None if value is None else self.enum_cls(value)
+
+
+def euros(cents: int) -> float:
+    """Перевести сумму из центов (как хранится в БД) в евро для вывода"""
+    return cents / 100
+
+
+def to_cents(value: float) -> int:
+    """Перевести сумму в евро (ввод админа) в центы"""
+    return round(value * 100)
+
+
+# Базовый класс для всех моделей
+class Base(DeclarativeBase):
+    # Значения по умолчанию со стороны БД (created_at и т.д.) сразу возвращаются через RETURNING
+    __mapper_args__ = {"eager_defaults": True}
+
+
+# Пользователи
+class User(Base):
+    __tablename__ = 'users'
+    
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    telegram_id: Mapped[int] = mapped_column(BigInteger, unique=True, nullable=False)
+    username: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    first_name: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    last_name: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    is_banned: Mapped[bool] = mapped_column(Boolean, default=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    
+    # Связи
+    cart_items: Mapped[List["Cart"]] = relationship("Cart", back_populates="user", cascade="save-update, merge", passive_deletes=True, lazy="raise_on_sql")
+    orders: Mapped[List["Order"]] = relationship("Order", back_populates="user", cascade="save-update, merge", passive_deletes=True, lazy="raise_on_sql")
+    
+    def __repr__(self):
+        return f"<User(id={self.id}, telegram_id={self.telegram_id}, username={self.username})>"
+
+
+# Модели вейпов (Elf Bar, HQD и т.д.)
+class Model(Base):
+    __tablename__ = 'models'
+    
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
+    description: Mapped[Optional[str]] = mapped_column(Text, nullable=True, deferred=True, deferred_raiseload=True)
+    image_path: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)  # Путь к картинке модели
+    photo_file_id: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)  # file_id фото в Telegram (отправка без загрузки файла)
+    cost_price: Mapped[int] = mapped_column(Integer, default=0)  # Себестоимость в центах для расчета revenue
+    is_available: Mapped[bool] = mapped_column(Boolean, default=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    
+    # Связи
+    products: Mapped[List["Product"]] = relationship("Product", back_populates="model", cascade="save-update, merge", passive_deletes=True, lazy="raise_on_sql")
+    
+    def __repr__(self):
+        return f"<Model(id={self.id}, name={self.name})>"
+
+
+# Вкусы (привязаны к моделям)
+class Product(Base):
+    __tablename__ = 'products'
+    __table_args__ = (
+        Index('ix_products_model_available', 'model_id', 'is_available'),  # Вкусы модели в каталоге
+    )
+    
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    model_id: Mapped[int] = mapped_column(ForeignKey('models.id', ondelete='CASCADE'), nullable=False)
+    flavor_name: Mapped[str] = mapped_column(String(255), nullable=False)
+    price: Mapped[int] = mapped_column(Integer, nullable=False)  # Цена в центах
+    stock_quantity: Mapped[int] = mapped_column(Integer, default=0)  # Количество на складе
+    is_available: Mapped[bool] = mapped_column(Boolean, default=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    
+    # Связи
+    model: Mapped["Model"] = relationship("Model", back_populates="products", lazy="raise_on_sql")
+    cart_items: Mapped[List["Cart"]] = relationship("Cart", back_populates="product", cascade="save-update, merge", passive_deletes=True, lazy="raise_on_sql")
+    order_items: Mapped[List["OrderItem"]] = relationship("OrderItem", back_populates="product", passive_deletes=True, lazy="raise_on_sql")
+    
+    def __repr__(self):
+        return f"<Product(id={self.id}, model_id={self.model_id}, flavor={self.flavor_name}, price={self.price})>"
+
+
+# Корзина
+class Cart(Base):
+    __tablename__ = 'cart'
+    __table_args__ = (
+        Index('uq_cart_user_product', 'user_id', 'product_id', unique=True),  # Корзина пользователя, без дубликатов товара
+    )
+    
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    product_id: Mapped[int] = mapped_column(ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    quantity: Mapped[int] = mapped_column(Integer, default=1)
+    added_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    
+    # Связи
+    user: Mapped["User"] = relationship("User", back_populates="cart_items", lazy="raise_on_sql")
+    product: Mapped["Product"] = relationship("Product", back_populates="cart_items", lazy="raise_on_sql")
+    
+    def __repr__(self):
+        return f"<Cart(user_id={self.user_id}, product_id={self.product_id}, quantity={self.quantity})>"
+
+
+# Итоги корзины (кол-во позиций и сумма). Заполняется только триггерами БД на cart/products,
+# чтобы /cart получал итог одним запросом по первичному ключу
+class CartSummary(Base):
+    __tablename__ = 'cart_summary'
+    
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    line_count: Mapped[int] = mapped_column(Integer, default=0)  # Количество позиций в корзине
+    subtotal: Mapped[int] = mapped_column(Integer, default=0)  # Сумма товаров в центах
+    updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    
+    def __repr__(self):
+        return f"<CartSummary(user_id={self.user_id}, lines={self.line_count}, subtotal={self.subtotal})>"
+
+
+# Заказы
+class Order(Base):
+    __tablename__ = 'orders'
+    __table_args__ = (
+        Index('ix_orders_user_status', 'user_id', 'status'),  # Активный заказ пользователя
+        Index('ix_orders_user_created', 'user_id', 'created_at'),  # Заказы пользователя, новые первыми
+        Index('ix_orders_created', 'created_at'),  # Сортировка списка заказов
+    )
+    
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    total_price: Mapped[int] = mapped_column(Integer, nullable=False)  # Итого в центах
+    status: Mapped[OrderStatus] = mapped_column(IntEnumType(OrderStatus), default=OrderStatus.PROCESSING)
+    delivery_method: Mapped[DeliveryMethod] = mapped_column(IntEnumType(DeliveryMethod), default=DeliveryMethod.PICKUP)
+    delivery_fee: Mapped[int] = mapped_column(Integer, default=0)  # Стоимость доставки в центах
+    contact_info: Mapped[Optional[str]] = mapped_column(Text, nullable=True, deferred=True, deferred_raiseload=True)  # Telegram username или другие контакты
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+    
+    # Связи
+    user: Mapped["User"] = relationship("User", back_populates="orders", lazy="raise_on_sql")
+    items: Mapped[List["OrderItem"]] = relationship("OrderItem", back_populates="order", cascade="save-update, merge", passive_deletes=True, lazy="raise_on_sql")
+    
+    def __repr__(self):
+        return f"<Order(id={self.id}, user_id={self.user_id}, total={self.total_price}, status={self.status})>"
+
+
+# Товары в заказе
+class OrderItem(Base):
+    __tablename__ = 'order_items'
+    __table_args__ = (
+        Index('ix_order_items_order', 'order_id'),
+        Index('ix_order_items_product', 'product_id'),  # Топ товаров
+    )
+    
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    order_id: Mapped[int] = mapped_column(ForeignKey('orders.id', ondelete='CASCADE'), nullable=False)
+    product_id: Mapped[int] = mapped_column(ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    quantity: Mapped[int] = mapped_column(Integer, nullable=False)
+    price_at_order: Mapped[int] = mapped_column(Integer, nullable=False)  # Цена на момент заказа в центах
+    
+    # Связи
+    order: Mapped["Order"] = relationship("Order", back_populates="items", lazy="raise_on_sql")
+    product: Mapped["Product"] = relationship("Product", back_populates="order_items", lazy="raise_on_sql")
+    
+    def __repr__(self):
+        return f"<OrderItem(order_id={self.order_id}, product_id={self.product_id}, qty={self.quantity})>"
+
+
+# Настройки бота (приветственное сообщение и т.д.)
+class BotSettings(Base):
+    __tablename__ = 'bot_settings'
+    
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    setting_key: Mapped[str] = mapped_column(String(100), unique=True, nullable=False)
+    setting_value: Mapped[str] = mapped_column(Text, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
         return f"<BotSettings(key={self.setting_key})>"
\ No newline at end of file
@@ -1,7 +1,13 @@
-"""
-Handlers package для Liquid Planet Bot
-"""
-
-from . import user, admin
-
-__all__ = ['user', 'admin']
+"""
+Handlers package для Liquid Planet Bot
+"""
+
+import os
+from dotenv import load_dotenv
+
+# .env загружается один раз на весь пакет - до импорта модулей, которые читают переменные окружения
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
+
+from . import user, admin, dispatch
+
+__all__ = ['user', 'admin', 'dispatch']
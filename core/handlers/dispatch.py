@@ -0,0 +1,40 @@
+"""
+Маршрутизация callback-запросов
+Один CallbackQueryHandler: обработчик выбирается по префиксу callback_data через словарь,
+без перебора regex-шаблонов на каждое нажатие
+"""
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from . import user, admin
+
+
+# Префикс callback_data (первое слово или первые два слова через '_') -> обработчик.
+# Все, что не найдено, обрабатывает user.handle_callback
+CALLBACK_ROUTES = {
+    'admin': admin.handle_admin_callback,
+    'setstatus': admin.handle_admin_callback,
+    'view': admin.handle_admin_callback,
+    'edit': admin.handle_admin_callback,
+    'change_status': admin.handle_admin_callback,
+    'select_model': admin.handle_admin_callback,
+    'confirm_delete': admin.handle_admin_callback,
+    'confirm_reset': admin.handle_admin_callback,
+    'delete_order': admin.handle_admin_callback,
+}
+
+
+def get_callback_handler(data: str):
+    """Найти обработчик для callback_data"""
+    head, _, rest = data.partition('_')
+    handler = CALLBACK_ROUTES.get(head)
+    if handler is None:
+        handler = CALLBACK_ROUTES.get(f"{head}_{rest.partition('_')[0]}", user.handle_callback)
+    return handler
+
+
+async def dispatch_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Передать callback-запрос обработчику по префиксу"""
+    handler = get_callback_handler(update.callback_query.data or '')
+    await handler(update, context)
\ No newline at end of file
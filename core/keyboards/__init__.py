@@ -1,7 +1,7 @@
-"""
-Keyboards package для Liquid Planet Bot
-"""
-
-from .inline import *
-
-__all__ = ['inline']
+"""
+Keyboards package для Liquid Planet Bot
+"""
+
+from .inline import *
+
+__all__ = ['inline']
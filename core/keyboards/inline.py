@@ -1,263 +1,316 @@
-"""
-Inline клавиатуры для python-telegram-bot
-"""
-
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-
-
-# ==================== ГЛАВНОЕ МЕНЮ ====================
-
-def get_main_menu_kb(is_admin: bool = False):
-    """Главное меню бота"""
-    keyboard = [
-        [InlineKeyboardButton("🛍 Выбрать модель", callback_data="catalog")],
-        [InlineKeyboardButton("🛒 Корзина", callback_data="cart")],
-        [InlineKeyboardButton("📦 Мои заказы", callback_data="my_orders")],
-        [InlineKeyboardButton("📞 Поддержка", callback_data="support")],
-    ]
-    
-    return InlineKeyboardMarkup(keyboard)
-
-
-def get_back_to_menu_kb():
-    """Простая клавиатура с кнопками возврата"""
-    keyboard = [
-        [InlineKeyboardButton("🛍 Выбрать модель", callback_data="catalog")],
-        [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")],
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-
-def get_after_add_to_cart_kb():
-    """Клавиатура после добавления в корзину"""
-    keyboard = [
-        [InlineKeyboardButton("🛒 Просмотреть корзину", callback_data="cart")],
-        [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")],
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-
-# ==================== КАТАЛОГ ====================
-
-def get_models_kb(models):
-    """Клавиатура с моделями вейпов"""
-    keyboard = []
-    
-    for model in models:
-        keyboard.append([InlineKeyboardButton(model.name, callback_data=f"model_{model.id}")])
-    
-    keyboard.append([InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")])
-    
-    return InlineKeyboardMarkup(keyboard)
-
-
-def get_products_kb(products, model_id):
-    """Клавиатура с вкусами для модели"""
-    keyboard = []
-    
-    for product in products:
-        stock_text = f" (осталось {product.stock_quantity})" if product.stock_quantity < 10 else ""
-        text = f"{product.flavor_name} - {product.price}€{stock_text}"
-        keyboard.append([InlineKeyboardButton(text, callback_data=f"product_{product.id}")])
-    
-    keyboard.append([InlineKeyboardButton("◀️ К моделям", callback_data="catalog")])
-    keyboard.append([InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")])
-    
-    return InlineKeyboardMarkup(keyboard)
-
-
-def get_product_quantity_kb(product_id):
-    """Клавиатура выбора количества товара"""
-    keyboard = [
-        [
-            InlineKeyboardButton("1", callback_data=f"addcart_{product_id}_1"),
-            InlineKeyboardButton("2", callback_data=f"addcart_{product_id}_2"),
-            InlineKeyboardButton("3", callback_data=f"addcart_{product_id}_3"),
-        ],
-        [
-            InlineKeyboardButton("5", callback_data=f"addcart_{product_id}_5"),
-            InlineKeyboardButton("10", callback_data=f"addcart_{product_id}_10"),
-        ],
-        [InlineKeyboardButton("◀️ Назад", callback_data="back_to_products")],
-        [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-    ]
-    
-    return InlineKeyboardMarkup(keyboard)
-
-
-# ==================== КОРЗИНА ====================
-
-def get_cart_kb(cart_items_data, has_items=True):
-    """Клавиатура корзины
-    cart_items_data: список кортежей (item, product, model) или пустой список
-    """
-    keyboard = []
-    
-    if has_items and cart_items_data:
-        for item, product, model in cart_items_data:
-            text = f"❌ {product.flavor_name} ({item.quantity} шт)"
-            keyboard.append([InlineKeyboardButton(text, callback_data=f"removecart_{item.id}")])
-        
-        keyboard.append([InlineKeyboardButton("✅ Оформить заказ", callback_data="checkout")])
-        keyboard.append([InlineKeyboardButton("🗑 Очистить корзину", callback_data="clear_cart")])
-    
-    keyboard.append([InlineKeyboardButton("🛍 Продолжить покупки", callback_data="catalog")])
-    keyboard.append([InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")])
-    
-    return InlineKeyboardMarkup(keyboard)
-
-
-def get_delivery_method_kb():
-    """Выбор способа доставки"""
-    keyboard = [
-        [InlineKeyboardButton("🏃 Самовывоз (бесплатно)", callback_data="delivery_pickup")],
-        [InlineKeyboardButton("🚚 Доставка (+5€)", callback_data="delivery_delivery")],
-        [InlineKeyboardButton("❌ Отменить", callback_data="cart")]
-    ]
-    
-    return InlineKeyboardMarkup(keyboard)
-
-
-def get_confirm_order_kb(delivery_method: str):
-    """Подтверждение оформления заказа"""
-    keyboard = [
-        [InlineKeyboardButton("✅ Подтвердить заказ", callback_data=f"confirm_order_{delivery_method}")],
-        [InlineKeyboardButton("◀️ Изменить доставку", callback_data="checkout")],
-        [InlineKeyboardButton("❌ Отменить", callback_data="cart")]
-    ]
-    
-    return InlineKeyboardMarkup(keyboard)
-
-
-# ==================== ЗАКАЗЫ ====================
-
-def get_orders_kb(orders):
-    """Клавиатура со списком заказов"""
-    keyboard = []
-    
-    # Проверяем формат данных (список кортежей или просто заказов)
-    if orders and isinstance(orders[0], tuple):
-        # Формат: [(order, user), ...]
-        for order, user in orders:
-            status_emoji = {
-                'processing': '📦',
-                'completed': '✅'
-            }.get(order.status, '❓')
-            
-            username = f"@{user.username}" if user and user.username else ("👤 " + (user.first_name if user else "Неизвестно"))
-            text = f"{status_emoji} #{order.id} {username} - {order.total_price}€"
-            keyboard.append([InlineKeyboardButton(text, callback_data=f"order_{order.id}")])
-    else:
-        # Формат: [order, ...] (без информации о пользователе)
-        for order in orders:
-            status_emoji = {
-                'processing': '📦',
-                'completed': '✅'
-            }.get(order.status, '❓')
-            
-            text = f"{status_emoji} Заказ #{order.id} - {order.total_price}€"
-            keyboard.append([InlineKeyboardButton(text, callback_data=f"order_{order.id}")])
-    
-    keyboard.append([InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")])
-    
-    return InlineKeyboardMarkup(keyboard)
-
-
-def get_order_detail_kb(order_id, is_admin=False, is_processing=False):
-    """Детали заказа"""
-    keyboard = []
-    
-    if is_admin:
-        keyboard.append([InlineKeyboardButton("✏️ Изменить статус", callback_data=f"change_status_{order_id}")])
-        keyboard.append([InlineKeyboardButton("◀️ К заказам", callback_data="admin_orders")])
-        keyboard.append([InlineKeyboardButton("🏠 Админ-панель", callback_data="admin_panel")])
-    else:
-        # Если заказ в процессе - добавляем кнопку редактирования
-        if is_processing:
-            keyboard.append([InlineKeyboardButton("➕ Добавить товары", callback_data="catalog")])
-        keyboard.append([InlineKeyboardButton("◀️ К заказам", callback_data="my_orders")])
-        keyboard.append([InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")])
-    
-    return InlineKeyboardMarkup(keyboard)
-
-
-# ==================== АДМИН ПАНЕЛЬ ====================
-
-def get_admin_panel_kb(maintenance_mode: bool = False):
-    """Админ панель"""
-    maintenance_status = "✅ ВКЛ" if maintenance_mode else "❌ ВЫКЛ"
-    keyboard = [
-        [InlineKeyboardButton("📦 Заказы", callback_data="admin_orders")],
-        [InlineKeyboardButton("🎨 Товары", callback_data="admin_products")],
-        [InlineKeyboardButton("👥 Пользователи", callback_data="admin_users")],
-        [InlineKeyboardButton("📊 Статистика", callback_data="admin_stats")],
-        [InlineKeyboardButton("💾 Бэкап БД", callback_data="admin_backup")],
-        [InlineKeyboardButton(f"🔧 Тех. работы [{maintenance_status}]", callback_data="admin_maintenance")],
-        [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-    ]
-    
-    return InlineKeyboardMarkup(keyboard)
-
-
-def get_admin_products_kb():
-    """Управление товарами"""
-    keyboard = [
-        [InlineKeyboardButton("➕ Добавить модель", callback_data="admin_add_model")],
-        [InlineKeyboardButton("➕ Добавить вкус", callback_data="admin_add_product")],
-        [InlineKeyboardButton("📱 Просмотреть модели/вкусы", callback_data="admin_view_models")],
-        [InlineKeyboardButton("◀️ Назад", callback_data="admin_panel")]
-    ]
-    
-    return InlineKeyboardMarkup(keyboard)
-
-
-def get_order_status_kb(order_id):
-    """Изменение статуса заказа"""
-    keyboard = [
-        [InlineKeyboardButton("📦 В процессе", callback_data=f"setstatus_{order_id}_processing")],
-        [InlineKeyboardButton("✅ Готов", callback_data=f"setstatus_{order_id}_completed")],
-        [InlineKeyboardButton("🗑 Удалить заказ", callback_data=f"delete_order_{order_id}")],
-        [InlineKeyboardButton("◀️ Назад", callback_data="admin_orders")]
-    ]
-    
-    return InlineKeyboardMarkup(keyboard)
-
-
-def get_admin_users_kb(users):
-    """Список пользователей"""
-    keyboard = []
-    
-    for user in users[:10]:
-        status = "🚫" if user.is_banned else "✅"
-        text = f"{status} {user.username or user.first_name or f'ID{user.telegram_id}'}"
-        keyboard.append([InlineKeyboardButton(text, callback_data=f"admin_user_{user.id}")])
-    
-    keyboard.append([InlineKeyboardButton("◀️ Назад", callback_data="admin_panel")])
-    
-    return InlineKeyboardMarkup(keyboard)
-
-
-def get_admin_user_actions_kb(user_id, is_banned):
-    """Действия с пользователем"""
-    keyboard = []
-    
-    if is_banned:
-        keyboard.append([InlineKeyboardButton("✅ Разбанить", callback_data=f"admin_unban_{user_id}")])
-    else:
-        keyboard.append([InlineKeyboardButton("🚫 Забанить", callback_data=f"admin_ban_{user_id}")])
-    
-    keyboard.append([InlineKeyboardButton("◀️ К пользователям", callback_data="admin_users")])
-    
-    return InlineKeyboardMarkup(keyboard)
-
-
-# ==================== ПОДДЕРЖКА ====================
-
-def get_support_kb(support_username):
-    """Кнопка связи с поддержкой"""
-    keyboard = [
-        [InlineKeyboardButton("📞 Написать в поддержку", url=f"https://t.me/{support_username}")],
-        [InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu")]
-    ]
-    
-    return InlineKeyboardMarkup(keyboard)
+"""
+Inline клавиатуры для python-telegram-bot
+Клавиатуры без переменных данных кэшируются (functools.cache), клавиатуры с ID и другими
+простыми параметрами - ограниченным lru_cache: InlineKeyboardMarkup неизменяемый,
+поэтому один объект можно отправлять сколько угодно раз
+"""
+
+from functools import cache, lru_cache
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from ..db.models import OrderStatus, euros
+
+
+# Постоянные строки кнопок (кнопки неизменяемые - одни и те же объекты идут во все клавиатуры)
+MAIN_MENU_ROW = (InlineKeyboardButton("🏠 Главное меню", callback_data="main_menu"),)
+CATALOG_ROW = (InlineKeyboardButton("🛍 Продолжить покупки", callback_data="catalog"),)
+BACK_TO_MODELS_ROW = (InlineKeyboardButton("◀️ К моделям", callback_data="catalog"),)
+BACK_TO_ADMIN_PANEL_ROW = (InlineKeyboardButton("◀️ Назад", callback_data="admin_panel"),)
+BACK_TO_ADMIN_PRODUCTS_ROW = (InlineKeyboardButton("◀️ Назад", callback_data="admin_products"),)
+CANCEL_TO_ADMIN_PRODUCTS_ROW = (InlineKeyboardButton("❌ Отмена", callback_data="admin_products"),)
+
+ORDER_STATUS_EMOJI = {OrderStatus.PROCESSING: '📦', OrderStatus.COMPLETED: '✅'}
+
+
+# ==================== ГЛАВНОЕ МЕНЮ ====================
+
+@cache
+def get_main_menu_kb(is_admin: bool = False):
+    """Главное меню бота"""
+    keyboard = [
+        [InlineKeyboardButton("🛍 Выбрать модель", callback_data="catalog")],
+        [InlineKeyboardButton("🛒 Корзина", callback_data="cart")],
+        [InlineKeyboardButton("📦 Мои заказы", callback_data="my_orders")],
+        [InlineKeyboardButton("📞 Поддержка", callback_data="support")],
+    ]
+    
+    return InlineKeyboardMarkup(keyboard)
+
+
+@cache
+def get_back_to_menu_kb():
+    """Простая клавиатура с кнопками возврата"""
+    keyboard = [
+        [InlineKeyboardButton("🛍 Выбрать модель", callback_data="catalog")],
+        MAIN_MENU_ROW,
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+
+@cache
+def get_after_add_to_cart_kb():
+    """Клавиатура после добавления в корзину"""
+    keyboard = [
+        [InlineKeyboardButton("🛒 Просмотреть корзину", callback_data="cart")],
+        MAIN_MENU_ROW,
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+
+# ==================== КАТАЛОГ ====================
+
+def get_models_kb(models):
+    """Клавиатура с моделями вейпов (модели или строки с полями id, name)"""
+    keyboard = [[InlineKeyboardButton(model.name, callback_data=f"model_{model.id}")] for model in models]
+    keyboard.append(MAIN_MENU_ROW)
+    
+    return InlineKeyboardMarkup(keyboard)
+
+
+def get_products_kb(products, model_id):
+    """Клавиатура с вкусами для модели (вкусы или строки с полями id, flavor_name, price, stock_quantity)"""
+    keyboard = [
+        [InlineKeyboardButton(
+            f"{product.flavor_name} - {euros(product.price)}€"
+            + (f" (осталось {product.stock_quantity})" if product.stock_quantity < 10 else ""),
+            callback_data=f"product_{product.id}"
+        )]
+        for product in products
+    ]
+    keyboard.append(BACK_TO_MODELS_ROW)
+    keyboard.append(MAIN_MENU_ROW)
+    
+    return InlineKeyboardMarkup(keyboard)
+
+
+@lru_cache(maxsize=256)
+def get_product_quantity_kb(product_id):
+    """Клавиатура выбора количества товара"""
+    keyboard = [
+        [
+            InlineKeyboardButton("1", callback_data=f"addcart_{product_id}_1"),
+            InlineKeyboardButton("2", callback_data=f"addcart_{product_id}_2"),
+            InlineKeyboardButton("3", callback_data=f"addcart_{product_id}_3"),
+        ],
+        [
+            InlineKeyboardButton("5", callback_data=f"addcart_{product_id}_5"),
+            InlineKeyboardButton("10", callback_data=f"addcart_{product_id}_10"),
+        ],
+        [InlineKeyboardButton("◀️ Назад", callback_data="back_to_products")],
+        MAIN_MENU_ROW
+    ]
+    
+    return InlineKeyboardMarkup(keyboard)
+
+
+# ==================== КОРЗИНА ====================
+
+def get_cart_kb(cart_items_data, has_items=True):
+    """Клавиатура корзины
+    cart_items_data: список кортежей (item, product, model) или пустой список
+    """
+    keyboard = []
+    
+    if has_items and cart_items_data:
+        keyboard = [
+            [InlineKeyboardButton(f"❌ {product.flavor_name} ({item.quantity} шт)", callback_data=f"removecart_{item.id}")]
+            for item, product, model in cart_items_data
+        ]
+        keyboard.append([InlineKeyboardButton("✅ Оформить заказ", callback_data="checkout")])
+        keyboard.append([InlineKeyboardButton("🗑 Очистить корзину", callback_data="clear_cart")])
+    
+    keyboard.append(CATALOG_ROW)
+    keyboard.append(MAIN_MENU_ROW)
+    
+    return InlineKeyboardMarkup(keyboard)
+
+
+@cache
+def get_delivery_method_kb():
+    """Выбор способа доставки"""
+    keyboard = [
+        [InlineKeyboardButton("🏃 Самовывоз (бесплатно)", callback_data="delivery_pickup")],
+        [InlineKeyboardButton("🚚 Доставка (+5€)", callback_data="delivery_delivery")],
+        [InlineKeyboardButton("❌ Отменить", callback_data="cart")]
+    ]
+    
+    return InlineKeyboardMarkup(keyboard)
+
+
+@cache
+def get_confirm_order_kb(delivery_method: str):
+    """Подтверждение оформления заказа"""
+    keyboard = [
+        [InlineKeyboardButton("✅ Подтвердить заказ", callback_data=f"confirm_order_{delivery_method}")],
+        [InlineKeyboardButton("◀️ Изменить доставку", callback_data="checkout")],
+        [InlineKeyboardButton("❌ Отменить", callback_data="cart")]
+    ]
+    
+    return InlineKeyboardMarkup(keyboard)
+
+
+# ==================== ЗАКАЗЫ ====================
+
+def get_orders_kb(orders, with_users: bool = False):
+    """Клавиатура со списком заказов (with_users=True - строки crud.get_orders_list с именем пользователя)"""
+    keyboard = []
+    
+    for order in orders:
+        status_emoji = ORDER_STATUS_EMOJI.get(order.status, '❓')
+        
+        if with_users:
+            username = f"@{order.username}" if order.username else ("👤 " + (order.first_name or "Неизвестно"))
+            text = f"{status_emoji} #{order.id} {username} - {euros(order.total_price)}€"
+        else:
+            text = f"{status_emoji} Заказ #{order.id} - {euros(order.total_price)}€"
+        keyboard.append([InlineKeyboardButton(text, callback_data=f"order_{order.id}")])
+    
+    keyboard.append(MAIN_MENU_ROW)
+    
+    return InlineKeyboardMarkup(keyboard)
+
+
+@lru_cache(maxsize=256)
+def get_order_detail_kb(order_id, is_admin=False, is_processing=False):
+    """Детали заказа"""
+    keyboard = []
+    
+    if is_admin:
+        keyboard.append([InlineKeyboardButton("✏️ Изменить статус", callback_data=f"change_status_{order_id}")])
+        keyboard.append([InlineKeyboardButton("◀️ К заказам", callback_data="admin_orders")])
+        keyboard.append([InlineKeyboardButton("🏠 Админ-панель", callback_data="admin_panel")])
+    else:
+        # Если заказ в процессе - добавляем кнопку редактирования
+        if is_processing:
+            keyboard.append([InlineKeyboardButton("➕ Добавить товары", callback_data="catalog")])
+        keyboard.append([InlineKeyboardButton("◀️ К заказам", callback_data="my_orders")])
+        keyboard.append(MAIN_MENU_ROW)
+    
+    return InlineKeyboardMarkup(keyboard)
+
+
+# ==================== АДМИН ПАНЕЛЬ ====================
+
+@cache
+def get_admin_panel_kb(maintenance_mode: bool = False):
+    """Админ панель"""
+    maintenance_status = "✅ ВКЛ" if maintenance_mode else "❌ ВЫКЛ"
+    keyboard = [
+        [InlineKeyboardButton("📦 Заказы", callback_data="admin_orders")],
+        [InlineKeyboardButton("🎨 Товары", callback_data="admin_products")],
+        [InlineKeyboardButton("👥 Пользователи", callback_data="admin_users")],
+        [InlineKeyboardButton("📊 Статистика", callback_data="admin_stats")],
+        [InlineKeyboardButton("💾 Бэкап БД", callback_data="admin_backup")],
+        [InlineKeyboardButton(f"🔧 Тех. работы [{maintenance_status}]", callback_data="admin_maintenance")],
+        MAIN_MENU_ROW
+    ]
+    
+    return InlineKeyboardMarkup(keyboard)
+
+
+@cache
+def get_admin_products_kb():
+    """Управление товарами"""
+    keyboard = [
+        [InlineKeyboardButton("➕ Добавить модель", callback_data="admin_add_model")],
+        [InlineKeyboardButton("➕ Добавить вкус", callback_data="admin_add_product")],
+        [InlineKeyboardButton("📱 Просмотреть модели/вкусы", callback_data="admin_view_models")],
+        BACK_TO_ADMIN_PANEL_ROW
+    ]
+    
+    return InlineKeyboardMarkup(keyboard)
+
+
+@cache
+def get_admin_cancel_kb():
+    """Отмена шага в админских диалогах (возврат к управлению товарами)"""
+    return InlineKeyboardMarkup([CANCEL_TO_ADMIN_PRODUCTS_ROW])
+
+
+@cache
+def get_admin_skip_photo_kb():
+    """Пропуск загрузки фото модели"""
+    return InlineKeyboardMarkup([[InlineKeyboardButton("❌ Пропустить", callback_data="admin_products")]])
+
+
+@lru_cache(maxsize=256)
+def get_confirm_delete_kb(confirm_data: str, cancel_data: str):
+    """Подтверждение удаления: [Да, удалить] / [Отмена]"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("✅ Да, удалить", callback_data=confirm_data)],
+        [InlineKeyboardButton("❌ Отмена", callback_data=cancel_data)]
+    ])
+
+
+@cache
+def get_confirm_reset_db_kb():
+    """Подтверждение очистки базы"""
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("✅ Да, очистить базу", callback_data="confirm_reset_db")],
+        [InlineKeyboardButton("❌ Отмена", callback_data="admin_panel")]
+    ])
+
+
+@lru_cache(maxsize=256)
+def get_order_status_kb(order_id):
+    """Изменение статуса заказа"""
+    keyboard = [
+        [InlineKeyboardButton("📦 В процессе", callback_data=f"setstatus_{order_id}_processing")],
+        [InlineKeyboardButton("✅ Готов", callback_data=f"setstatus_{order_id}_completed")],
+        [InlineKeyboardButton("🗑 Удалить заказ", callback_data=f"delete_order_{order_id}")],
+        [InlineKeyboardButton("◀️ Назад", callback_data="admin_orders")]
+    ]
+    
+    return InlineKeyboardMarkup(keyboard)
+
+
+def get_admin_users_kb(users, page: int = 0, has_next: bool = False):
+    """Страница списка пользователей (строки crud.get_users_list) с переходом между страницами"""
+    keyboard = [
+        [InlineKeyboardButton(
+            f"{'🚫' if user.is_banned else '✅'} {user.username or user.first_name or f'ID{user.telegram_id}'}",
+            callback_data=f"admin_user_{user.id}"
+        )]
+        for user in users
+    ]
+    
+    nav_row = []
+    if page > 0:
+        nav_row.append(InlineKeyboardButton("⬅️", callback_data=f"admin_users_page_{page - 1}"))
+    if has_next:
+        nav_row.append(InlineKeyboardButton("➡️", callback_data=f"admin_users_page_{page + 1}"))
+    if nav_row:
+        keyboard.append(nav_row)
+    
+    keyboard.append(BACK_TO_ADMIN_PANEL_ROW)
+    
+    return InlineKeyboardMarkup(keyboard)
+
+
+@lru_cache(maxsize=256)
+def get_admin_user_actions_kb(user_id, is_banned):
+    """Действия с пользователем"""
+    keyboard = []
+    
+    if is_banned:
+        keyboard.append([InlineKeyboardButton("✅ Разбанить", callback_data=f"admin_unban_{user_id}")])
+    else:
+        keyboard.append([InlineKeyboardButton("🚫 Забанить", callback_data=f"admin_ban_{user_id}")])
+    
+    keyboard.append([InlineKeyboardButton("◀️ К пользователям", callback_data="admin_users")])
+    
+    return InlineKeyboardMarkup(keyboard)
+
+
+# ==================== ПОДДЕРЖКА ====================
+
+@lru_cache(maxsize=32)
+def get_support_kb(support_username):
+    """Кнопка связи с поддержкой"""
+    keyboard = [
+        [InlineKeyboardButton("📞 Написать в поддержку", url=f"https://t.me/{support_username}")],
+        MAIN_MENU_ROW
+    ]
+    
+    return InlineKeyboardMarkup(keyboard)
@@ -1,7 +1,7 @@
-"""
-States package для Liquid Planet Bot
-"""
-
-from .user_states import *
-
-__all__ = ['user_states']
+"""
+States package для Liquid Planet Bot
+"""
+
+from .user_states import UserState
+
+__all__ = ['UserState']
@@ -1,29 +1,31 @@
-"""
-FSM States для бота (управление состояниями диалогов)
-Для python-telegram-bot используются простые строковые константы
-"""
-
-# Order states
-ORDER_WAITING_CONTACT = "order_waiting_contact"
-ORDER_WAITING_CONFIRMATION = "order_waiting_confirmation"
-
-# Admin add model states
-ADMIN_ADD_MODEL_NAME = "admin_add_model_name"
-ADMIN_ADD_MODEL_DESCRIPTION = "admin_add_model_description"
-ADMIN_ADD_MODEL_COST = "admin_add_model_cost"
-ADMIN_ADD_MODEL_IMAGE = "admin_add_model_image"
-
-# Admin add product states
-ADMIN_ADD_PRODUCT_MODEL = "admin_add_product_model"
-ADMIN_ADD_PRODUCT_FLAVOR = "admin_add_product_flavor"
-ADMIN_ADD_PRODUCT_PRICE = "admin_add_product_price"
-ADMIN_ADD_PRODUCT_STOCK = "admin_add_product_stock"
-
-# Admin edit product states
-ADMIN_EDIT_PRODUCT_ID = "admin_edit_product_id"
-ADMIN_EDIT_PRODUCT_FIELD = "admin_edit_product_field"
-ADMIN_EDIT_PRODUCT_VALUE = "admin_edit_product_value"
-
-# Admin settings states
-ADMIN_SETTINGS_KEY = "admin_settings_key"
-ADMIN_SETTINGS_VALUE = "admin_settings_value"
+"""
+FSM States для бота (управление состояниями диалогов)
+Состояния - IntEnum: в context.user_data['state'] хранится int (UserState.X.value),
+сравнение и выбор обработчика по словарю идут по целому числу
+"""
+
+from enum import IntEnum
+
+
+class UserState(IntEnum):
+    """Состояния диалогов"""
+    
+    # Order states
+    ORDER_WAITING_CONTACT = 1
+    
+    # Admin add model states
+    ADMIN_ADD_MODEL_NAME = 10
+    ADMIN_ADD_MODEL_DESCRIPTION = 11
+    ADMIN_ADD_MODEL_COST = 12
+    ADMIN_ADD_MODEL_IMAGE = 13
+    
+    # Admin add product states
+    ADMIN_ADD_PRODUCT_MODEL = 20
+    ADMIN_ADD_PRODUCT_FLAVOR = 21
+    ADMIN_ADD_PRODUCT_PRICE = 22
+    ADMIN_ADD_PRODUCT_STOCK = 23
+    
+    # Admin edit states
+    ADMIN_EDIT_PRODUCT_PRICE = 30
+    ADMIN_EDIT_PRODUCT_STOCK = 31
+    ADMIN_EDIT_MODEL_DESCRIPTION = 32
\ No newline at end of file